@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.utils.config import Config
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def normalizar_pergunta(pergunta):
+    """Chave exata: minúsculas e espaços colapsados"""
+    return " ".join(pergunta.lower().split())
+
+
+def assinatura_trechos(trechos):
+    """Assinatura do conjunto de chunks recuperados (IDs já são hash do conteúdo)"""
+    ids = sorted(t['id'] for t in trechos)
+    return hashlib.sha256("|".join(ids).encode('utf-8')).hexdigest()[:16]
+
+
+def id_entrada(entrada):
+    """ID estável de uma resposta salva (usado nos registros de uso do log)"""
+    chave = f"{entrada['assinatura']}\n{entrada['pergunta']}"
+    return hashlib.sha256(chave.encode('utf-8')).hexdigest()[:16]
+
+
+class QueryEmbeddingCache:
+    """Nível 1: LRU de embeddings por pergunta exata (normalizada)"""
+
+    def __init__(self, model, maxsize=1024):
+        self.model = model
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, pergunta):
+        chave = normalizar_pergunta(pergunta)
+
+        with self._lock:
+            if chave in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(chave)
+                return self._cache[chave]
+            self.misses += 1
+
+        embedding = np.asarray(self.model.encode([pergunta])[0], dtype=np.float32)
+
+        with self._lock:
+            self._cache[chave] = embedding
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+        return embedding
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': round(self.hits / total, 3) if total else 0.0,
+            'tamanho': len(self._cache)
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Nível 2: respostas reaproveitadas por similaridade semântica.
+
+    Uma resposta salva é devolvida quando a nova pergunta tem cosseno acima do
+    limiar com uma pergunta anterior e os chunks recuperados são os mesmos
+    (mesma assinatura). O cache é persistido como log JSON Lines: cada resposta
+    nova acrescenta uma linha e cada acerto um registro curto de uso
+    ({"uso": id, "ultimo_uso": t}), para a ordem LRU sobreviver a reinícios.
+    O arquivo só é reescrito (compactação) quando o log passa do limite de
+    entradas em 25%.
+    """
+
+    def __init__(self, path=None, limiar=None, max_entradas=2000):
+        self.path = path or Config.RAG_CACHE_PATH or os.path.join(current_dir, "answer_cache.jsonl")
+        self.limiar = Config.RAG_CACHE_THRESHOLD if limiar is None else limiar
+        self.max_entradas = max_entradas
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.entradas = []
+        self._linhas_log = 0
+        if os.path.exists(self.path):
+            try:
+                self.entradas = self._ler()
+            except (ValueError, OSError) as e:
+                print(f"Aviso: cache de respostas ignorado ({e})")
+        self._reconstruir_matriz()
+
+    def _ler(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            conteudo = f.read()
+
+        entradas, por_id, invalidas = [], {}, 0
+        for linha in conteudo.splitlines():
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                # Linha incompleta (processo interrompido no meio da escrita)
+                invalidas += 1
+                continue
+
+            if 'uso' in registro:
+                entrada = por_id.get(registro['uso'])
+                if entrada is not None:
+                    entrada['ultimo_uso'] = registro['ultimo_uso']
+            else:
+                entradas.append(registro)
+                por_id[id_entrada(registro)] = registro
+            self._linhas_log += 1
+
+        # Reescreve sem a linha quebrada, senão o próximo append colaria nela
+        if invalidas:
+            self._compactar(entradas)
+        return entradas
+
+    def _normalizar(self, matriz):
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        return matriz / normas
+
+    def _reconstruir_matriz(self):
+        if self.entradas:
+            matriz = np.asarray([e['embedding'] for e in self.entradas], dtype=np.float32)
+            self._matriz = self._normalizar(matriz)
+        else:
+            self._matriz = None
+
+    def buscar(self, embedding, assinatura):
+        """Retorna a resposta salva ou None"""
+        with self._lock:
+            if self._matriz is None:
+                self.misses += 1
+                return None
+
+            consulta = np.asarray(embedding, dtype=np.float32)
+            consulta = consulta / (np.linalg.norm(consulta) or 1.0)
+            similaridades = self._matriz @ consulta
+
+            for pos in np.argsort(-similaridades):
+                if similaridades[pos] < self.limiar:
+                    break
+                entrada = self.entradas[pos]
+                if entrada['assinatura'] == assinatura:
+                    self.hits += 1
+                    entrada['ultimo_uso'] = time.time()
+                    self._registrar({'uso': id_entrada(entrada), 'ultimo_uso': entrada['ultimo_uso']})
+                    return entrada['resposta']
+
+            self.misses += 1
+            return None
+
+    def salvar(self, pergunta, embedding, assinatura, resposta):
+        entrada = {
+            'pergunta': pergunta,
+            'embedding': np.asarray(embedding, dtype=np.float32).round(6).tolist(),
+            'assinatura': assinatura,
+            'resposta': resposta,
+            'ultimo_uso': time.time()
+        }
+
+        with self._lock:
+            self.entradas.append(entrada)
+            linha = self._normalizar(np.asarray([entrada['embedding']], dtype=np.float32))
+            self._matriz = linha if self._matriz is None else np.vstack([self._matriz, linha])
+
+            self._registrar(entrada)
+
+    def _registrar(self, registro):
+        """Acrescenta um registro ao log ou, se ele cresceu demais, compacta (chamado com o lock)"""
+        if self._linhas_log < self.max_entradas * 1.25:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            self._linhas_log += 1
+            return
+
+        # Descarta as entradas usadas há mais tempo; o log reescrito já traz o ultimo_uso atual
+        if len(self.entradas) > self.max_entradas:
+            self.entradas.sort(key=lambda e: e['ultimo_uso'], reverse=True)
+            self.entradas = self.entradas[:self.max_entradas]
+            self._reconstruir_matriz()
+        self._compactar(self.entradas)
+
+    def _compactar(self, entradas):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for entrada in entradas:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+        self._linhas_log = len(entradas)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'taxa_acerto': round(self.hits / total, 3) if total else 0.0,
+            'entradas': len(self.entradas)
+        }
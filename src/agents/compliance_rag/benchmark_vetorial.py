@@ -0,0 +1,87 @@
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from .vector_store import NumpyVectorStore, CAMINHOS_PADRAO, QUANTIZACOES, normalizar
+
+
+def gerar_sintetico(n, dim=384, grupos=64, consultas=200, seed=42):
+    """Corpus sintético agrupado (parecido com embeddings reais) e consultas ruidosas"""
+    rng = np.random.default_rng(seed)
+    centros = rng.normal(size=(grupos, dim))
+    corpus = centros[rng.integers(0, grupos, size=n)] + 0.8 * rng.normal(size=(n, dim))
+    perguntas = corpus[rng.choice(n, size=consultas, replace=False)] + 0.5 * rng.normal(size=(consultas, dim))
+    return normalizar(corpus), normalizar(perguntas)
+
+
+def medir(store, perguntas, k, exatos=None):
+    """Tempo médio por consulta e recall@k contra a busca exata"""
+    resultados = []
+    inicio = time.perf_counter()
+    for pergunta in perguntas:
+        resultados.append([r['id'] for r in store.query(pergunta, k=k)])
+    duracao = time.perf_counter() - inicio
+
+    recall = None
+    if exatos is not None:
+        acertos = sum(len(set(r) & set(e)) for r, e in zip(resultados, exatos))
+        recall = acertos / max(sum(len(e) for e in exatos), 1)
+
+    return resultados, duracao / max(len(perguntas), 1) * 1000, recall
+
+
+def rodar(path=None, sintetico=None, k=4, rescore=4, consultas=200):
+    if sintetico:
+        # Índice sintético em diretório temporário, apagado ao final
+        with tempfile.TemporaryDirectory(prefix="benchmark_vetorial_") as tmp:
+            corpus, perguntas = gerar_sintetico(sintetico, consultas=consultas)
+            store = NumpyVectorStore(tmp, criar=True, quantizacao='none')
+            ids = [f"doc_{i}" for i in range(len(corpus))]
+            store.upsert(ids, [""] * len(ids), [{}] * len(ids), corpus)
+            print(f"Corpus sintético: {len(corpus)} vetores de dimensão {corpus.shape[1]} em {tmp}")
+            comparar(tmp, perguntas, k, rescore)
+        return
+
+    path = path or CAMINHOS_PADRAO['numpy']
+    base = NumpyVectorStore(path, quantizacao='none')
+    if not base.count():
+        print(f"ERRO: índice vazio em {path}")
+        return
+    # Consultas = vetores do próprio índice com ruído
+    rng = np.random.default_rng(42)
+    amostra = np.asarray(base.matrix[rng.choice(base.count(), size=min(consultas, base.count()), replace=False)])
+    perguntas = normalizar(amostra + 0.05 * rng.normal(size=amostra.shape))
+    print(f"Índice: {base.count()} vetores em {path}")
+    comparar(path, perguntas, k, rescore)
+
+
+def comparar(path, perguntas, k, rescore):
+    """Tabela de memória, latência e recall de cada modo de quantização"""
+    print(f"k={k}, rescore={rescore}x, {len(perguntas)} consultas\n")
+    print(f"{'modo':<8} {'memória':>12} {'redução':>8} {'ms/consulta':>12} {'recall@k':>9}")
+
+    exatos = None
+    for modo in QUANTIZACOES:
+        store = NumpyVectorStore(path, quantizacao=modo, rescore=rescore, ivf_lists=0)
+        resultados, ms, recall = medir(store, perguntas, k, exatos)
+        if exatos is None:
+            exatos, recall = resultados, 1.0
+
+        tamanhos = store.tamanho_bytes()
+        memoria = tamanhos['quantizado'] or tamanhos['float32']
+        reducao = tamanhos['float32'] / max(memoria, 1)
+        print(f"{modo:<8} {memoria / 1024:>10.1f}KB {reducao:>7.1f}x {ms:>12.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara busca float32, int8 e binária no backend numpy")
+    parser.add_argument('--path', help="Diretório do índice numpy (padrão: numpy_index)")
+    parser.add_argument('--sintetico', type=int, help="Usa N vetores sintéticos em vez do índice")
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--rescore', type=int, default=4, help="Candidatos reavaliados em float = k * rescore")
+    parser.add_argument('--consultas', type=int, default=200)
+    args = parser.parse_args()
+
+    rodar(args.path, args.sintetico, k=args.k, rescore=args.rescore, consultas=args.consultas)
@@ -1,55 +1,76 @@
 import os
-import chromadb
-from sentence_transformers import SentenceTransformer
+import time
+import threading
 from groq import Groq
 from dotenv import load_dotenv
 
+from .runtime import get_runtime
+from .answer_cache import assinatura_trechos
+
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-if not GROQ_API_KEY:
-    print("ERRO: Chave da API não encontrada! Verifique seu arquivo .env")
-    exit()
-
 NOME_BOT = "Dunder Bot"
 CARGO_BOT = "Assistente de Compliance da Dunder Mifflin"
 
-current_dir = os.path.dirname(os.path.abspath(__file__))
-db_path = os.path.join(current_dir, "chroma_db")
-
-print("Ligando o servidor na mesa do Dwight... (Aguarde)")
+_client_groq = None
+_client_lock = threading.Lock()
+
+def get_client_groq():
+    """Cliente da Groq, criado uma única vez"""
+    global _client_groq
+    if _client_groq is None:
+        with _client_lock:
+            if _client_groq is None:
+                if not GROQ_API_KEY:
+                    raise ValueError("GROQ_API_KEY não encontrada no .env")
+                _client_groq = Groq(api_key=GROQ_API_KEY)
+    return _client_groq
+
+def iniciar():
+    """Carrega modelo, banco, caches e cliente da IA antes da primeira pergunta"""
+    # Banco (Chroma ou NumPy), modelo de embeddings, busca híbrida e caches
+    get_runtime().aquecer()
+    # Conecta na Inteligência Artificial
+    get_client_groq()
+
+def processar_pergunta(pergunta, metricas=None):
+    """
+    Responde a pergunta em streaming (gerador de pedaços de texto).
 
-try:
-    # 1. Conecta no Banco de Dados
-    client_db = chromadb.PersistentClient(path=db_path)
-    collection = client_db.get_collection(name="regras_compliance")
-    
-    # 2. Carrega o modelo de tradução (Texto -> Números)
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    
-    # 3. Conecta na Inteligência Artificial
-    client_groq = Groq(api_key=GROQ_API_KEY)
-    
-    print("Sistema Online! Cuidado com o que você pergunta.\n")
-    
-except Exception as e:
-    print(f"ERRO: Não consegui carregar os arquivos.")
-    print(f"Detalhe do erro: {e}")
-    print("Dica: Verifique se a pasta 'chroma_db' existe e se o 'policy_loader.py' foi rodado.")
-    exit()
-
-def processar_pergunta(pergunta):
-    # 1. Busca no Banco
-    embedding = model.encode([pergunta]).tolist()
-    resultados = collection.query(query_embeddings=embedding, n_results=8)
-
-    trechos = resultados['documents'][0]
+    Args:
+        pergunta: Pergunta do usuário
+        metricas: Dict opcional preenchido com 'origem', 'primeiro_token_ms' e 'total_ms'
+    """
+    inicio = time.perf_counter()
+    metricas = metricas if metricas is not None else {}
+    runtime = get_runtime()
+
+    def registrar(origem, primeiro_token):
+        metricas['origem'] = origem
+        metricas['primeiro_token_ms'] = round((primeiro_token - inicio) * 1000, 1)
+        metricas['total_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+
+    # 1. Busca no Banco (híbrida, com rerank)
+    embedding = runtime.encode(pergunta)
+    trechos = runtime.retriever.recuperar(pergunta, embedding=embedding)
     
     # Se o banco não achar nada, avisa
     if not trechos:
-        return "Olha, revirei os arquivos e não encontrei nada sobre isso nas políticas da empresa. Deve ser coisa do Jim."
-
-    contexto = "\n\n".join(trechos)
+        registrar('sem_trechos', time.perf_counter())
+        yield "Olha, revirei os arquivos e não encontrei nada sobre isso nas políticas da empresa. Deve ser coisa do Jim."
+        return
+
+    # Pergunta parecida com os mesmos trechos? Reaproveita a resposta
+    assinatura = assinatura_trechos(trechos)
+    resposta_salva = runtime.cache_respostas.buscar(embedding, assinatura)
+    if resposta_salva is not None:
+        registrar('cache', time.perf_counter())
+        yield resposta_salva
+        return
+
+    # O contexto vai uma única vez, na mensagem do usuário
+    contexto = runtime.retriever.montar_contexto(trechos)
     
     # 2. Pergunta para a IA
     prompt_sistema = f"""
@@ -63,7 +84,7 @@ def processar_pergunta(pergunta):
     - Seja útil, mas faça o usuário sentir que ele deveria saber a regra.
     
     SUAS INSTRUÇÕES:
-    1. Responda a dúvida baseada ESTRITAMENTE no contexto: {contexto}
+    1. Responda a dúvida baseada ESTRITAMENTE no contexto enviado junto com a pergunta.
     2. Se a pergunta for idiota, diga que é idiota ou algo do tipo.
     3. Responda em Português.
 
@@ -76,20 +97,54 @@ def processar_pergunta(pergunta):
     Pergunta: {pergunta}
     """
 
+    partes = []
+    primeiro_token = None
     try:
-        chat_completion = client_groq.chat.completions.create(
+        stream = get_client_groq().chat.completions.create(
             messages=[
                 {"role": "system", "content": prompt_sistema},
                 {"role": "user", "content": prompt_usuario}
             ],
             model="llama-3.3-70b-versatile",
-            temperature=0.3
+            temperature=0.3,
+            stream=True
         )
-        return chat_completion.choices[0].message.content
+        for chunk in stream:
+            pedaco = chunk.choices[0].delta.content if chunk.choices else None
+            if not pedaco:
+                continue
+            if primeiro_token is None:
+                primeiro_token = time.perf_counter()
+            partes.append(pedaco)
+            yield pedaco
     except Exception as e:
-        return f"Falha no sistema. O computador pegou fogo? {e}"
+        registrar('erro', primeiro_token or time.perf_counter())
+        yield f"Falha no sistema. O computador pegou fogo? {e}"
+        return
+
+    registrar('groq', primeiro_token or time.perf_counter())
+    runtime.cache_respostas.salvar(pergunta, embedding, assinatura, "".join(partes))
+
+def responder(pergunta):
+    """Versão sem streaming: devolve a resposta completa"""
+    return "".join(processar_pergunta(pergunta))
 
 if __name__ == "__main__":
+    if not GROQ_API_KEY:
+        print("ERRO: Chave da API não encontrada! Verifique seu arquivo .env")
+        exit()
+
+    print("Ligando o servidor na mesa do Dwight... (Aguarde)")
+
+    try:
+        iniciar()
+        print("Sistema Online! Cuidado com o que você pergunta.\n")
+    except Exception as e:
+        print(f"ERRO: Não consegui carregar os arquivos.")
+        print(f"Detalhe do erro: {e}")
+        print("Dica: Verifique se o índice vetorial existe e se o 'policy_loader.py' foi rodado.")
+        exit()
+
     os.system('cls' if os.name == 'nt' else 'clear')
 
     print(f"{NOME_BOT.upper()} ONLINE 👓")
@@ -108,6 +163,8 @@ if __name__ == "__main__":
         # Comando para fechar
         if pergunta.lower() in ['sair', 'exit', 'tchau']:
             print(f"\n{NOME_BOT}: Finalmente. Vá trabalhar!!!!\n")
+            print(f"Cache de embeddings: {get_runtime().cache_embeddings.stats()}")
+            print(f"Cache de respostas: {get_runtime().cache_respostas.stats()}")
             break
         
         # Pula linha vazia
@@ -116,7 +173,11 @@ if __name__ == "__main__":
             
         print("\n🤖 Estou pensando, acalme-se...", end="\r") 
         
-        resposta = processar_pergunta(pergunta)
+        metricas = {}
+        print(f"\n🤖 {NOME_BOT}: ", end="", flush=True)
+        for pedaco in processar_pergunta(pergunta, metricas):
+            print(pedaco, end="", flush=True)
         
-        print(f"\n🤖 {NOME_BOT}: {resposta}\n")
+        print(f"\n\n(primeiro token: {metricas.get('primeiro_token_ms')} ms | "
+              f"total: {metricas.get('total_ms')} ms | origem: {metricas.get('origem')})")
         print("-" * 60)
\ No newline at end of file
@@ -1,64 +1,295 @@
 import os
-import chromadb
-from sentence_transformers import SentenceTransformer
+import re
+import time
+import queue
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from src.utils.config import Config
+from .vector_store import abrir_vector_store
+from .runtime import get_runtime
+
 current_dir = os.path.dirname(os.path.abspath(__file__))
-db_path = os.path.join(current_dir, "chroma_db")
 
 project_root = os.path.abspath(os.path.join(current_dir, "../../../"))
-file_path = os.path.join(project_root, "assets", "politica_compliance.txt")
 
-def carregar_dados():
-    print("INICIANDO O PROCESSO")
-    
-    # 1. Verifica se o arquivo existe
-    if not os.path.exists(file_path):
-        print(f"ERRO: Arquivo não encontrado em: {file_path}")
-        return
+EXTENSOES_POLITICA = ('.txt', '.md')
+
+# Banner de seção: linha de título logo após uma linha de "====="
+SECAO_PATTERN = re.compile(r'^=+\s*\n(.+?)\s*\n=+\s*$', re.MULTILINE)
+
+# "SEÇÃO 3: LISTA NEGRA" -> número da seção
+NUMERO_SECAO_PATTERN = re.compile(r'^SE[ÇC][ÃA]O\s+(\d+)', re.IGNORECASE)
+
+# Regra numerada no início da linha: "1.1. DESPESAS MENORES (...)"
+REGRA_PATTERN = re.compile(r'^(\d+(?:\.\d+)+)\.?\s+(.+?)\s*$', re.MULTILINE)
+
+# Tamanho máximo de um chunk estruturado antes de quebrar por linhas
+MAX_CHARS_CHUNK = 1200
+
+def chunk_id(fonte, texto):
+    """ID estável do chunk: hash do arquivo de origem + conteúdo"""
+    return "chunk_" + hashlib.sha256(f"{fonte}\n{texto}".encode('utf-8')).hexdigest()[:16]
+
+def resolver_caminho(caminho):
+    """Caminhos relativos (como no .env) são relativos à raiz do projeto"""
+    return caminho if os.path.isabs(caminho) else os.path.join(project_root, caminho)
+
+def listar_documentos(caminho):
+    """Aceita um arquivo único ou um diretório com vários documentos de política"""
+    if os.path.isfile(caminho):
+        return [caminho]
+
+    arquivos = []
+    for raiz, _, nomes in os.walk(caminho):
+        for nome in sorted(nomes):
+            if nome.lower().endswith(EXTENSOES_POLITICA):
+                arquivos.append(os.path.join(raiz, nome))
+    return sorted(arquivos)
+
+def _quebrar_por_linhas(texto, inicio, max_chars=MAX_CHARS_CHUNK):
+    """Divide um bloco grande em pedaços de linhas inteiras, sem sobreposição"""
+    pedacos = []
+    atual, pos_atual = "", inicio
+    pos = inicio
+    for linha in texto.splitlines(keepends=True):
+        if atual and len(atual) + len(linha) > max_chars:
+            pedacos.append((pos_atual, atual))
+            atual, pos_atual = "", pos
+        atual += linha
+        pos += len(linha)
+    if atual:
+        pedacos.append((pos_atual, atual))
+    return pedacos
 
-    # 2. Ler o arquivo de texto
-    print(f"Lendo arquivo: {file_path}")
-    with open(file_path, 'r', encoding='utf-8') as f:
+def chunk_por_secoes(texto_completo, fonte, max_chars=MAX_CHARS_CHUNK):
+    """
+    Chunker estruturado: um chunk por regra numerada (ex: "1.2.") e um para o
+    texto introdutório de cada seção, sem sobreposição.
+
+    Returns:
+        Lista de chunks com o caminho da seção nos metadados
+    """
+    banners = list(SECAO_PATTERN.finditer(texto_completo))
+
+    # Blocos (titulo, inicio, fim): cabeçalho antes do primeiro banner + uma entrada por seção
+    blocos = []
+    if banners and banners[0].start() > 0:
+        blocos.append(("", 0, banners[0].start()))
+    for i, banner in enumerate(banners):
+        fim = banners[i + 1].start() if i + 1 < len(banners) else len(texto_completo)
+        blocos.append((banner.group(1).strip(), banner.end(), fim))
+
+    chunks = []
+    for secao, inicio_bloco, fim_bloco in blocos:
+        corpo = texto_completo[inicio_bloco:fim_bloco]
+        numero = NUMERO_SECAO_PATTERN.match(secao)
+
+        regras = list(REGRA_PATTERN.finditer(corpo))
+        trechos = []
+        if not regras or regras[0].start() > 0:
+            trechos.append(("", "", 0, regras[0].start() if regras else len(corpo)))
+        for i, regra in enumerate(regras):
+            fim = regras[i + 1].start() if i + 1 < len(regras) else len(corpo)
+            trechos.append((regra.group(1), regra.group(2), regra.start(), fim))
+
+        for numero_regra, titulo_regra, inicio, fim in trechos:
+            bruto = corpo[inicio:fim]
+            if not bruto.strip():
+                continue
+
+            caminho = " > ".join(p for p in (secao, f"{numero_regra}. {titulo_regra}" if numero_regra else "") if p)
+            for pos, texto in _quebrar_por_linhas(bruto, inicio_bloco + inicio, max_chars):
+                texto_limpo = texto.strip()
+                if not texto_limpo:
+                    continue
+                pos += texto.index(texto_limpo[0])
+                chunks.append({
+                    'id': chunk_id(fonte, f"{caminho}\n{texto_limpo}"),
+                    'texto': texto_limpo,
+                    'metadata': {
+                        'fonte': fonte,
+                        'secao': secao,
+                        'secao_numero': numero.group(1) if numero else "",
+                        'regra': numero_regra,
+                        'caminho': caminho,
+                        'inicio': pos,
+                        'fim': pos + len(texto_limpo)
+                    }
+                })
+    return chunks
+
+def chunk_documento(caminho_arquivo, chunker=None):
+    """Quebra um documento em chunks com metadados (roda dentro do pool de processos)"""
+    with open(caminho_arquivo, 'r', encoding='utf-8') as f:
         texto_completo = f.read()
 
-    # 3. Quebrar o texto em pedaços (Chunking OTIMIZADO)
-    print("Dividindo o texto inteligentemente...")
+    fonte = os.path.relpath(caminho_arquivo, project_root)
+
+    # Documentos com banners de seção usam o chunker estruturado
+    chunker = chunker or Config.POLICY_CHUNKER
+    if chunker == 'secoes' and SECAO_PATTERN.search(texto_completo):
+        return chunk_por_secoes(texto_completo, fonte)
+
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,      # Pedaços maiores (pega mais contexto)
         chunk_overlap=200,    # Sobreposição (repete 200 chars para não perder o fio da meada)
-        separators=["\n\n", "\n", ".", " ", ""] # Tenta quebrar primeiro em parágrafos, depois frases
+        separators=["\n\n", "\n", ".", " ", ""], # Tenta quebrar primeiro em parágrafos, depois frases
+        add_start_index=True
     )
-    chunks = text_splitter.split_text(texto_completo)
-    
-    print(f"Texto dividido em {len(chunks)} pedaços robustos.")
+    documentos = text_splitter.create_documents([texto_completo])
 
-    # 4. Inicializar Modelo e Banco de Dados
-    print("Carregando modelo e banco de dados...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    client = chromadb.PersistentClient(path=db_path)
+    secoes = [(m.start(), m.group(1).strip()) for m in SECAO_PATTERN.finditer(texto_completo)]
 
+    chunks = []
+    for doc in documentos:
+        inicio = doc.metadata['start_index']
+        secao = next((titulo for pos, titulo in reversed(secoes) if pos <= inicio), "")
+        chunks.append({
+            'id': chunk_id(fonte, doc.page_content),
+            'texto': doc.page_content,
+            'metadata': {
+                'fonte': fonte,
+                'secao': secao,
+                'inicio': inicio,
+                'fim': inicio + len(doc.page_content)
+            }
+        })
+    return chunks
+
+def gerar_embeddings(model, chunks, batch_size, fila, erros):
+    """Produtor: gera embeddings em lotes e entrega numa fila limitada"""
     try:
-        client.delete_collection(name="regras_compliance")
-        print("Coleção antiga apagada para atualização.")
-    except:
-        pass
-
-    collection = client.create_collection(name="regras_compliance")
-
-    # 5. Gerar Embeddings e Salvar
-    print("Gerando matemática e salvando...")
-    
-    ids = [f"id_{i}" for i in range(len(chunks))]
-    embeddings = model.encode(chunks).tolist()
-
-    collection.add(
-        documents=chunks,
-        embeddings=embeddings,
-        ids=ids
-    )
+        for i in range(0, len(chunks), batch_size):
+            lote = chunks[i:i + batch_size]
+            embeddings = model.encode([c['texto'] for c in lote], batch_size=batch_size)
+            fila.put((lote, embeddings))
+    except Exception as e:
+        erros.append(e)
+    finally:
+        fila.put(None)
+
+def carregar_dados(caminho=None, batch_size=64, workers=None, lote_escrita=512, backend=None, chunker=None):
+    print("INICIANDO O PROCESSO")
+
+    caminho = resolver_caminho(caminho or Config.POLICY_PATH)
+
+    # 1. Verifica se o arquivo/diretório existe
+    if not os.path.exists(caminho):
+        print(f"ERRO: Caminho não encontrado: {caminho}")
+        return
+
+    arquivos = listar_documentos(caminho)
+    if not arquivos:
+        print(f"ERRO: Nenhum documento ({', '.join(EXTENSOES_POLITICA)}) em: {caminho}")
+        return
+    print(f"Encontrados {len(arquivos)} documentos de política em: {caminho}")
+
+    # 2. Quebrar os documentos em pedaços, em paralelo
+    print("Dividindo os textos inteligentemente...")
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        resultados = list(executor.map(chunk_documento, arquivos, [chunker] * len(arquivos)))
+    duracao = time.perf_counter() - inicio
+
+    chunks_por_id = {}
+    for chunks_arquivo in resultados:
+        for chunk in chunks_arquivo:
+            chunks_por_id.setdefault(chunk['id'], chunk)
+
+    print(f"Textos divididos em {len(chunks_por_id)} pedaços robustos "
+          f"({len(chunks_por_id) / max(duracao, 1e-9):.0f} chunks/s).")
+
+    # 3. Conectar no banco e comparar com o que já está indexado
+    print("Conectando no banco de dados...")
+    store = abrir_vector_store(backend, criar=True)
+
+    # O ID não inclui a posição no arquivo: um chunk que só mudou de lugar
+    # mantém o embedding, mas precisa dos novos metadados (inicio/fim)
+    metadados_existentes = {c['id']: c['metadata'] for c in store.listar()}
+    ids_novos = [i for i in chunks_por_id if i not in metadados_existentes]
+    ids_removidos = [i for i in metadados_existentes if i not in chunks_por_id]
+    ids_movidos = [
+        i for i, chunk in chunks_por_id.items()
+        if i in metadados_existentes and metadados_existentes[i] != chunk['metadata']
+    ]
+
+    print(f"Diferença: {len(ids_novos)} novos/alterados, {len(ids_removidos)} removidos, "
+          f"{len(ids_movidos)} com metadados atualizados, "
+          f"{len(chunks_por_id) - len(ids_novos) - len(ids_movidos)} inalterados.")
+
+    # Backend numpy: grava a matriz e reconstrói IVF/códigos uma vez só, no final
+    with store.em_lote():
+        for i in range(0, len(ids_removidos), lote_escrita):
+            store.delete(ids_removidos[i:i + lote_escrita])
 
-    print(f"SUCESSO! {len(chunks)} documentos salvos em {db_path}")
+        for i in range(0, len(ids_movidos), lote_escrita):
+            lote = ids_movidos[i:i + lote_escrita]
+            store.update_metadata(lote, [chunks_por_id[c]['metadata'] for c in lote])
+
+        if not ids_novos:
+            print("Nada para gerar. Base já está atualizada.")
+            return
+
+        # 4. Gerar Embeddings só do que mudou e salvar em lotes
+        print("Carregando modelo e gerando matemática só do que mudou...")
+        model = get_runtime().model
+
+        pendentes = [chunks_por_id[i] for i in ids_novos]
+        fila = queue.Queue(maxsize=4)
+        erros = []
+        produtor = threading.Thread(
+            target=gerar_embeddings, args=(model, pendentes, batch_size, fila, erros), daemon=True
+        )
+
+        inicio = time.perf_counter()
+        produtor.start()
+
+        buffer_chunks, buffer_embeddings = [], []
+        salvos = 0
+
+        def escrever():
+            store.upsert(
+                ids=[c['id'] for c in buffer_chunks],
+                documents=[c['texto'] for c in buffer_chunks],
+                metadatas=[c['metadata'] for c in buffer_chunks],
+                embeddings=buffer_embeddings
+            )
+
+        while (item := fila.get()) is not None:
+            lote, embeddings = item
+            buffer_chunks.extend(lote)
+            buffer_embeddings.extend(embeddings)
+
+            if len(buffer_chunks) >= lote_escrita:
+                escrever()
+                salvos += len(buffer_chunks)
+                buffer_chunks, buffer_embeddings = [], []
+
+        if buffer_chunks:
+            escrever()
+            salvos += len(buffer_chunks)
+
+        produtor.join()
+        if erros:
+            raise erros[0]
+
+    duracao = time.perf_counter() - inicio
+    print(f"SUCESSO! {salvos} documentos atualizados em {store.path} "
+          f"({store.count()} no total, {salvos / max(duracao, 1e-9):.1f} chunks/s)")
 
 if __name__ == "__main__":
-    carregar_dados()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Indexa documentos de política de compliance")
+    parser.add_argument('--caminho', help="Arquivo ou diretório de políticas (padrão: POLICY_PATH)")
+    parser.add_argument('--batch-size', type=int, default=64, help="Tamanho do lote de embeddings")
+    parser.add_argument('--workers', type=int, default=None, help="Processos para o chunking")
+    parser.add_argument('--backend', choices=['chroma', 'numpy'], help="Backend vetorial (padrão: VECTOR_BACKEND)")
+    parser.add_argument('--chunker', choices=['secoes', 'recursivo'], help="Estratégia de chunking (padrão: POLICY_CHUNKER)")
+    args = parser.parse_args()
+
+    carregar_dados(args.caminho, batch_size=args.batch_size, workers=args.workers,
+                   backend=args.backend, chunker=args.chunker)
@@ -1,36 +1,25 @@
-import os
-import chromadb
-from sentence_transformers import SentenceTransformer
-
-# CONFIGURAÇÃO 
-current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.abspath(os.path.join(current_dir, "../../../"))
-db_path = os.path.join(project_root, "chroma_db")
+from .runtime import get_runtime
 
 def buscar_resposta(pergunta):
     
     print(f"PERGUNTA: {pergunta}")
     
-    # 1. Conectar ao Banco
+    # 1. Conectar ao Banco (carregado uma vez e reaproveitado entre chamadas)
+    runtime = get_runtime()
     try:
-        client = chromadb.PersistentClient(path=db_path)
-        collection = client.get_collection(name="regras_compliance")
+        store = runtime.store
     except Exception as e:
         print(f"Erro ao conectar: {e}")
         return
 
-    # 2. Gerar Embedding
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embedding = model.encode([pergunta]).tolist()
+    # 2. Gerar Embedding (modelo carregado só na primeira chamada)
+    embedding = runtime.encode(pergunta)
 
     # 3. Buscar
-    resultados = collection.query(
-        query_embeddings=embedding,
-        n_results=3  # Traz os top 3 trechos
-    )
+    resultados = store.query(embedding, k=3)  # Traz os top 3 trechos
 
     # 4. Exibir Resultados Limpos
-    documentos = resultados['documents'][0]
+    documentos = [r['texto'] for r in resultados]
     
     if not documentos:
         print("Nenhum trecho relevante encontrado.")
@@ -0,0 +1,204 @@
+import re
+import math
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+from src.utils.config import Config
+
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'e', 'de', 'da', 'do', 'das', 'dos', 'em', 'na', 'no', 'nas', 'nos',
+    'um', 'uma', 'por', 'para', 'com', 'que', 'se', 'ao', 'aos', 'ou', 'eu', 'posso', 'pode',
+    'sobre', 'qual', 'quais', 'como', 'sao', 'ser', 'me', 'meu', 'minha'
+}
+
+
+def tokenizar(texto):
+    """Minúsculas, sem acentos e sem stopwords"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in re.findall(r'\w+', texto) if t not in STOPWORDS]
+
+
+# "seção 3", "secao 2" na pergunta -> pré-filtro pela seção da política
+SECAO_PERGUNTA_PATTERN = re.compile(r'\bse[cç][aã]o\s+(\d+)', re.IGNORECASE)
+
+
+def filtro_secao(pergunta):
+    """Filtro de metadados quando a pergunta cita uma seção, senão None"""
+    encontrado = SECAO_PERGUNTA_PATTERN.search(pergunta)
+    return {'secao_numero': encontrado.group(1)} if encontrado else None
+
+
+def estimar_tokens(texto):
+    """Estimativa grosseira de tokens (~4 caracteres por token)"""
+    return max(1, len(texto) // 4)
+
+
+class BM25Index:
+    """Índice BM25 (Okapi) em memória sobre os chunks da política"""
+
+    def __init__(self, documentos, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.tokens = [tokenizar(doc) for doc in documentos]
+        self.frequencias = [Counter(tokens) for tokens in self.tokens]
+        self.tamanhos = [len(tokens) for tokens in self.tokens]
+        self.tamanho_medio = sum(self.tamanhos) / max(len(self.tamanhos), 1)
+
+        df = Counter()
+        for tokens in self.tokens:
+            df.update(set(tokens))
+        n = len(documentos)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def buscar(self, consulta, k=20):
+        """Retorna [(posição, score)] dos k melhores documentos"""
+        termos = [t for t in tokenizar(consulta) if t in self.idf]
+        if not termos:
+            return []
+
+        scores = []
+        for pos, freq in enumerate(self.frequencias):
+            score = 0.0
+            norma = self.k1 * (1 - self.b + self.b * self.tamanhos[pos] / self.tamanho_medio)
+            for termo in termos:
+                tf = freq.get(termo, 0)
+                if tf:
+                    score += self.idf[termo] * tf * (self.k1 + 1) / (tf + norma)
+            if score > 0:
+                scores.append((pos, score))
+
+        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+
+
+class HybridRetriever:
+    """
+    Recuperação híbrida para o chatbot de compliance.
+
+    1. Busca densa (backend vetorial) + BM25 sobre os mesmos chunks.
+    2. Fusão por Reciprocal Rank Fusion (RRF).
+    3. Rerank opcional: MMR (diversidade) ou cross-encoder.
+    4. Montagem do contexto dentro de um orçamento de tokens.
+    """
+
+    def __init__(self, store, model, candidatos=20, k=4, reranker=None,
+                 orcamento_tokens=None, rrf_k=60, mmr_lambda=0.7):
+        self.store = store
+        self.model = model
+        self.candidatos = candidatos
+        self.k = k
+        self.rrf_k = rrf_k
+        self.mmr_lambda = mmr_lambda
+        self.orcamento_tokens = orcamento_tokens or Config.RAG_CONTEXT_TOKENS
+
+        self.chunks = store.listar()
+        self.bm25 = BM25Index([c['texto'] for c in self.chunks])
+
+        reranker = (reranker or Config.RAG_RERANKER).strip()
+        self.cross_encoder = None
+        if reranker.lower() in ('mmr', 'none', ''):
+            self.reranker = reranker.lower() or 'none'
+        else:
+            from sentence_transformers import CrossEncoder
+            self.cross_encoder = CrossEncoder(reranker)
+            self.reranker = 'cross-encoder'
+
+    def _fundir(self, densos, lexicais):
+        """Reciprocal Rank Fusion das duas listas"""
+        fusao = {}
+        for rank, item in enumerate(densos):
+            fusao.setdefault(item['id'], {'chunk': item, 'score': 0.0})
+            fusao[item['id']]['score'] += 1.0 / (self.rrf_k + rank + 1)
+
+        for rank, (pos, _) in enumerate(lexicais):
+            chunk = self.chunks[pos]
+            fusao.setdefault(chunk['id'], {'chunk': chunk, 'score': 0.0})
+            fusao[chunk['id']]['score'] += 1.0 / (self.rrf_k + rank + 1)
+
+        ordenados = sorted(fusao.values(), key=lambda x: x['score'], reverse=True)
+        return [item['chunk'] for item in ordenados[:self.candidatos]]
+
+    def _mmr(self, embedding, candidatos):
+        """Maximal Marginal Relevance: relevância com penalidade por redundância"""
+        if len(candidatos) <= 1:
+            return candidatos
+
+        vetores = self.store.get_embeddings([c['id'] for c in candidatos])
+        consulta = np.asarray(embedding, dtype=np.float32)
+        consulta = consulta / (np.linalg.norm(consulta) or 1.0)
+        relevancia = vetores @ consulta
+
+        escolhidos = []
+        restantes = list(range(len(candidatos)))
+        while restantes and len(escolhidos) < self.k:
+            if escolhidos:
+                redundancia = np.max(vetores[restantes] @ vetores[escolhidos].T, axis=1)
+            else:
+                redundancia = np.zeros(len(restantes))
+            valores = self.mmr_lambda * relevancia[restantes] - (1 - self.mmr_lambda) * redundancia
+            melhor = restantes[int(np.argmax(valores))]
+            escolhidos.append(melhor)
+            restantes.remove(melhor)
+
+        return [candidatos[i] for i in escolhidos]
+
+    def _cross_encoder(self, pergunta, candidatos):
+        scores = self.cross_encoder.predict([(pergunta, c['texto']) for c in candidatos])
+        ordem = np.argsort(-np.asarray(scores))
+        return [candidatos[i] for i in ordem[:self.k]]
+
+    def recuperar(self, pergunta, embedding=None, where=None):
+        """
+        Recupera os chunks mais relevantes para a pergunta.
+
+        Args:
+            pergunta: Texto da pergunta
+            embedding: Embedding da pergunta (gerado aqui se não vier pronto)
+            where: Filtro de metadados (ex: {'secao_numero': '3'}); se não vier,
+                usa a seção citada na pergunta, quando houver
+
+        Returns:
+            Lista de chunks ({'id', 'texto', 'metadata'}) em ordem de relevância
+        """
+        if embedding is None:
+            embedding = self.model.encode([pergunta])[0]
+
+        if where is None:
+            where = filtro_secao(pergunta)
+            densos = self.store.query(embedding, k=self.candidatos, where=where) if where else []
+            # Seção inexistente (ou índice sem metadados de seção): busca sem filtro
+            if not densos:
+                where = None
+                densos = self.store.query(embedding, k=self.candidatos)
+        else:
+            densos = self.store.query(embedding, k=self.candidatos, where=where)
+        lexicais = self.bm25.buscar(pergunta, k=self.candidatos)
+        if where:
+            lexicais = [
+                (pos, score) for pos, score in lexicais
+                if all(self.chunks[pos]['metadata'].get(c) == v for c, v in where.items())
+            ]
+
+        candidatos = self._fundir(densos, lexicais)
+
+        if self.reranker == 'mmr':
+            return self._mmr(embedding, candidatos)
+        if self.reranker == 'cross-encoder':
+            return self._cross_encoder(pergunta, candidatos)
+        return candidatos[:self.k]
+
+    def montar_contexto(self, chunks):
+        """Junta os chunks (uma única vez) sem passar do orçamento de tokens"""
+        partes = []
+        usados = 0
+        for chunk in chunks:
+            secao = chunk['metadata'].get('caminho') or chunk['metadata'].get('secao')
+            texto = f"[{secao}]\n{chunk['texto']}" if secao else chunk['texto']
+            custo = estimar_tokens(texto)
+            if partes and usados + custo > self.orcamento_tokens:
+                break
+            partes.append(texto)
+            usados += custo
+        return "\n\n".join(partes)
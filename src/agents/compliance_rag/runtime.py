@@ -0,0 +1,90 @@
+import threading
+
+from .vector_store import abrir_vector_store
+from .retriever import HybridRetriever
+from .answer_cache import QueryEmbeddingCache, SemanticAnswerCache
+
+NOME_MODELO = 'all-MiniLM-L6-v2'
+
+
+class RetrievalRuntime:
+    """
+    Recursos de busca compartilhados (modelo de embeddings, backend vetorial,
+    retriever e caches).
+
+    Cada recurso é carregado na primeira vez que é usado, uma única vez, mesmo
+    com várias threads pedindo ao mesmo tempo. O chatbot, o `rag.py` e
+    qualquer servidor usam a mesma instância via `get_runtime()`.
+    """
+
+    def __init__(self, backend=None, nome_modelo=NOME_MODELO):
+        self.backend = backend
+        self.nome_modelo = nome_modelo
+        self._lock = threading.RLock()
+        self._model = None
+        self._store = None
+        self._retriever = None
+        self._cache_embeddings = None
+        self._cache_respostas = None
+
+    def _carregar(self, atributo, fabrica):
+        valor = getattr(self, atributo)
+        if valor is None:
+            with self._lock:
+                valor = getattr(self, atributo)
+                if valor is None:
+                    valor = fabrica()
+                    setattr(self, atributo, valor)
+        return valor
+
+    @property
+    def model(self):
+        def fabrica():
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(self.nome_modelo)
+        return self._carregar('_model', fabrica)
+
+    @property
+    def store(self):
+        return self._carregar('_store', lambda: abrir_vector_store(self.backend))
+
+    @property
+    def retriever(self):
+        return self._carregar('_retriever', lambda: HybridRetriever(self.store, self.model))
+
+    @property
+    def cache_embeddings(self):
+        return self._carregar('_cache_embeddings', lambda: QueryEmbeddingCache(self.model))
+
+    @property
+    def cache_respostas(self):
+        return self._carregar('_cache_respostas', SemanticAnswerCache)
+
+    def encode(self, pergunta):
+        """Embedding da pergunta (com cache LRU)"""
+        return self.cache_embeddings.encode(pergunta)
+
+    def buscar(self, pergunta, k=3):
+        """Busca densa simples no backend vetorial"""
+        return self.store.query(self.encode(pergunta), k=k)
+
+    def aquecer(self):
+        """Carrega tudo de uma vez (ex: antes de abrir o chat ou subir um servidor)"""
+        _ = self.retriever
+        _ = self.cache_embeddings
+        _ = self.cache_respostas
+        return self
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    """Instância única do runtime de busca no processo"""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = RetrievalRuntime()
+    return _runtime
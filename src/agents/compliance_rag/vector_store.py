@@ -0,0 +1,472 @@
+import os
+import json
+from contextlib import contextmanager
+
+import numpy as np
+
+from src.utils.config import Config
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+NOME_COLECAO = "regras_compliance"
+
+CAMINHOS_PADRAO = {
+    'chroma': os.path.join(current_dir, "chroma_db"),
+    'numpy': os.path.join(current_dir, "numpy_index")
+}
+
+
+def normalizar(matriz):
+    """Converte para float32 e normaliza cada linha (produto escalar = cosseno)"""
+    matriz = np.asarray(matriz, dtype=np.float32)
+    if matriz.ndim == 1:
+        matriz = matriz[None, :]
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+# Quantidade de bits 1 em cada byte (popcount para a distância de Hamming)
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+QUANTIZACOES = ('none', 'int8', 'binary')
+
+
+def quantizar_int8(matriz):
+    """
+    Quantização int8 simétrica por dimensão (4x menor que float32).
+
+    Returns:
+        (codigos int8, escala float32 por dimensão), com matriz ~= codigos * escala
+    """
+    matriz = np.asarray(matriz, dtype=np.float32)
+    maximos = np.abs(matriz).max(axis=0) if len(matriz) else np.ones(matriz.shape[1], dtype=np.float32)
+    maximos[maximos == 0] = 1.0
+    escala = (maximos / 127.0).astype(np.float32)
+    codigos = np.clip(np.rint(matriz / escala), -127, 127).astype(np.int8)
+    return codigos, escala
+
+
+def quantizar_binario(matriz):
+    """Quantização binária pelo sinal de cada dimensão (32x menor que float32)"""
+    return np.packbits(np.asarray(matriz) > 0, axis=1)
+
+
+def hamming(codigos, consulta_bits):
+    """Distância de Hamming entre cada linha de `codigos` e a consulta empacotada"""
+    return POPCOUNT[np.bitwise_xor(codigos, consulta_bits)].sum(axis=1, dtype=np.int32)
+
+
+class ChromaVectorStore:
+    """Backend Chroma (SQLite persistente)"""
+
+    def __init__(self, path, criar=False):
+        import chromadb
+
+        self.path = path
+        self.client = chromadb.PersistentClient(path=path)
+        if criar:
+            self.collection = self.client.get_or_create_collection(name=NOME_COLECAO)
+        else:
+            self.collection = self.client.get_collection(name=NOME_COLECAO)
+
+    def get_ids(self):
+        return self.collection.get(include=[])['ids']
+
+    def count(self):
+        return self.collection.count()
+
+    def listar(self):
+        """Todos os chunks indexados (sem embeddings)"""
+        dados = self.collection.get(include=['documents', 'metadatas'])
+        return [
+            {'id': i, 'texto': doc, 'metadata': meta or {}}
+            for i, doc, meta in zip(dados['ids'], dados['documents'], dados['metadatas'])
+        ]
+
+    def get_embeddings(self, ids):
+        """Matriz de embeddings normalizados na ordem dos ids pedidos"""
+        dados = self.collection.get(ids=list(ids), include=['embeddings'])
+        por_id = dict(zip(dados['ids'], dados['embeddings']))
+        return normalizar([por_id[i] for i in ids])
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        self.collection.upsert(
+            ids=list(ids),
+            documents=list(documents),
+            metadatas=list(metadatas),
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist()
+        )
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    @contextmanager
+    def em_lote(self):
+        """O Chroma já grava de forma incremental: nada a adiar"""
+        yield self
+
+    def flush(self):
+        pass
+
+    def update_metadata(self, ids, metadatas):
+        """Troca só os metadados (sem recalcular embeddings)"""
+        if ids:
+            self.collection.update(ids=list(ids), metadatas=list(metadatas))
+
+    def query(self, embedding, k=8, where=None):
+        resultados = self.collection.query(
+            query_embeddings=np.asarray(embedding, dtype=np.float32).reshape(1, -1).tolist(),
+            n_results=k,
+            where=where
+        )
+        metadatas = resultados.get('metadatas') or [[None] * len(resultados['ids'][0])]
+        # Distancia L2 ao quadrado; com embeddings normalizados, cosseno = 1 - d/2
+        return [
+            {'id': i, 'texto': doc, 'metadata': meta or {}, 'score': 1.0 - dist / 2.0}
+            for i, doc, meta, dist in zip(
+                resultados['ids'][0], resultados['documents'][0],
+                metadatas[0], resultados['distances'][0]
+            )
+        ]
+
+
+class NumpyVectorStore:
+    """
+    Backend em processo com NumPy.
+
+    Os vetores ficam normalizados numa matriz float32 em `embeddings.npy`
+    (aberta com memory-map) e textos/metadados em `metadata.json`. A busca e
+    o produto escalar exato (top-k). Com `ivf_lists > 0`, os vetores sao
+    agrupados por k-means e a busca olha so as `nprobe` listas mais proximas.
+
+    Com `quantizacao` 'int8' ou 'binary', a primeira passada usa os codigos
+    quantizados em memoria (`codes.npz`, 4x ou 32x menor) e so os
+    `k * rescore` melhores candidatos sao reavaliados com os vetores float32,
+    lidos do memory-map sob demanda.
+
+    Dentro de `em_lote()`, upsert/delete/update_metadata so alteram a memoria;
+    os arquivos, o IVF e os codigos sao regravados uma unica vez no `flush()`.
+    """
+
+    def __init__(self, path, criar=False, ivf_lists=None, nprobe=None, quantizacao=None, rescore=None):
+        self.path = path
+        self.ivf_lists = Config.VECTOR_IVF_LISTS if ivf_lists is None else ivf_lists
+        self.nprobe = Config.VECTOR_IVF_NPROBE if nprobe is None else nprobe
+        self.quantizacao = (quantizacao or Config.VECTOR_QUANTIZATION).lower()
+        self.rescore = Config.VECTOR_RESCORE if rescore is None else rescore
+
+        if self.quantizacao not in QUANTIZACOES:
+            raise ValueError(f"Quantizacao desconhecida: {self.quantizacao} (use {', '.join(QUANTIZACOES)})")
+
+        self._matrix_path = os.path.join(path, "embeddings.npy")
+        self._meta_path = os.path.join(path, "metadata.json")
+        self._ivf_path = os.path.join(path, "ivf.npz")
+        self._codes_path = os.path.join(path, "codes.npz")
+        self._em_lote = False
+        self._pendente = False
+        # True quando self.matrix ja e uma copia gravavel (nao o memory-map)
+        self._matriz_em_memoria = False
+
+        if not os.path.exists(self._meta_path):
+            if not criar:
+                raise FileNotFoundError(f"Indice NumPy nao encontrado em: {path}")
+            os.makedirs(path, exist_ok=True)
+
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self._meta_path):
+            self.matrix = np.load(self._matrix_path, mmap_mode='r')
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.ids = meta['ids']
+            self.documents = meta['documents']
+            self.metadatas = meta['metadatas']
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            self.ids, self.documents, self.metadatas = [], [], []
+
+        self._posicoes = {i: pos for pos, i in enumerate(self.ids)}
+        self._matriz_em_memoria = False
+
+        self.centroids = None
+        self.assignments = None
+        if self.ivf_lists and os.path.exists(self._ivf_path):
+            ivf = np.load(self._ivf_path)
+            if len(ivf['assignments']) == len(self.ids):
+                self.centroids = ivf['centroids']
+                self.assignments = ivf['assignments']
+
+        self.codes = None
+        self.escala = None
+        if self.quantizacao != 'none':
+            self._load_codes()
+
+    def _load_codes(self):
+        if os.path.exists(self._codes_path):
+            salvos = np.load(self._codes_path)
+            if str(salvos['quantizacao']) == self.quantizacao and len(salvos['codes']) == len(self.ids):
+                self.codes = salvos['codes']
+                self.escala = salvos['escala'] if self.quantizacao == 'int8' else None
+                return
+
+        # Indice criado sem quantizacao (ou com outra): quantiza em memoria
+        if self.ids:
+            self.codes, self.escala = self._quantizar(np.asarray(self.matrix))
+
+    def _quantizar(self, matrix):
+        if self.quantizacao == 'int8':
+            return quantizar_int8(matrix)
+        return quantizar_binario(matrix), None
+
+    def _save_codes(self, matrix):
+        if len(matrix) == 0:
+            if os.path.exists(self._codes_path):
+                os.remove(self._codes_path)
+            return
+
+        codes, escala = self._quantizar(matrix)
+        tmp_codes = self._codes_path + ".tmp.npz"
+        np.savez(
+            tmp_codes, codes=codes, quantizacao=self.quantizacao,
+            escala=escala if escala is not None else np.zeros(0, dtype=np.float32)
+        )
+        os.replace(tmp_codes, self._codes_path)
+
+    def tamanho_bytes(self):
+        """Memoria da matriz float32 e do indice quantizado (se houver)"""
+        return {
+            'float32': int(self.matrix.nbytes) if self.ids else 0,
+            'quantizado': int(self.codes.nbytes) if self.codes is not None else 0
+        }
+
+    def _write_meta(self):
+        tmp_meta = self._meta_path + ".tmp"
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({
+                'ids': self.ids,
+                'documents': self.documents,
+                'metadatas': self.metadatas
+            }, f, ensure_ascii=False)
+        return tmp_meta
+
+    def _save(self, matrix):
+        # Escreve em arquivos temporarios e troca, para leitores nunca verem meio arquivo
+        tmp_matrix = self._matrix_path + ".tmp.npy"
+
+        np.save(tmp_matrix, matrix)
+        tmp_meta = self._write_meta()
+
+        self.matrix = None
+        os.replace(tmp_matrix, self._matrix_path)
+        os.replace(tmp_meta, self._meta_path)
+
+        if self.ivf_lists:
+            self._build_ivf(matrix)
+        if self.quantizacao != 'none':
+            self._save_codes(matrix)
+        self._load()
+
+    def _gravar(self, matrix):
+        if not self._em_lote:
+            self._save(matrix)
+            return
+
+        # Fica em memoria ate o flush; IVF e codigos antigos nao valem mais
+        # (as consultas no meio do lote usam a busca exata)
+        self.matrix = matrix
+        self._matriz_em_memoria = True
+        self._posicoes = {i: pos for pos, i in enumerate(self.ids)}
+        self.centroids = self.assignments = None
+        self.codes = self.escala = None
+        self._pendente = True
+
+    @contextmanager
+    def em_lote(self):
+        """Agrupa varias escritas e grava tudo (com IVF e codigos) uma vez so no final"""
+        self._em_lote = True
+        try:
+            yield self
+        finally:
+            self._em_lote = False
+            self.flush()
+
+    def flush(self):
+        """Grava as alteracoes pendentes de `em_lote()`"""
+        if self._pendente:
+            self._pendente = False
+            self._save(np.asarray(self.matrix))
+
+    def _build_ivf(self, matrix, iteracoes=10, seed=42):
+        """K-means simples (esferico) para o modo IVF"""
+        n = len(matrix)
+        if n == 0:
+            if os.path.exists(self._ivf_path):
+                os.remove(self._ivf_path)
+            return
+
+        k = min(self.ivf_lists, n)
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(n, size=k, replace=False)].copy()
+
+        for _ in range(iteracoes):
+            assignments = np.argmax(matrix @ centroids.T, axis=1)
+            for c in range(k):
+                membros = matrix[assignments == c]
+                if len(membros):
+                    centroids[c] = membros.mean(axis=0)
+            centroids = normalizar(centroids)
+
+        assignments = np.argmax(matrix @ centroids.T, axis=1)
+        np.savez(self._ivf_path, centroids=centroids, assignments=assignments)
+
+    def get_ids(self):
+        return list(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def listar(self):
+        """Todos os chunks indexados (sem embeddings)"""
+        return [
+            {'id': i, 'texto': doc, 'metadata': meta}
+            for i, doc, meta in zip(self.ids, self.documents, self.metadatas)
+        ]
+
+    def get_embeddings(self, ids):
+        """Matriz de embeddings normalizados na ordem dos ids pedidos"""
+        return np.asarray(self.matrix[[self._posicoes[i] for i in ids]])
+
+    def upsert(self, ids, documents, metadatas, embeddings):
+        novos = normalizar(embeddings)
+        if not len(self.ids):
+            matrix = np.zeros((0, novos.shape[1]), dtype=np.float32)
+        else:
+            # Dentro de um lote a matriz pode ja ser uma copia em memoria;
+            # o memory-map e somente leitura e precisa ser copiado
+            matrix = self.matrix if self._matriz_em_memoria else np.array(self.matrix)
+
+        linhas_novas = []
+        for i, doc, meta, vetor in zip(ids, documents, metadatas, novos):
+            pos = self._posicoes.get(i)
+            if pos is not None:
+                matrix[pos] = vetor
+                self.documents[pos] = doc
+                self.metadatas[pos] = meta or {}
+            else:
+                self._posicoes[i] = len(self.ids)
+                self.ids.append(i)
+                self.documents.append(doc)
+                self.metadatas.append(meta or {})
+                linhas_novas.append(vetor)
+
+        if linhas_novas:
+            matrix = np.vstack([matrix, np.stack(linhas_novas)])
+
+        self._gravar(matrix)
+
+    def delete(self, ids):
+        remover = set(ids)
+        if not remover:
+            return
+
+        manter = [pos for pos, i in enumerate(self.ids) if i not in remover]
+        matrix = np.array(self.matrix[manter]) if manter else np.zeros((0, self.matrix.shape[1]), dtype=np.float32)
+
+        self.ids = [self.ids[pos] for pos in manter]
+        self.documents = [self.documents[pos] for pos in manter]
+        self.metadatas = [self.metadatas[pos] for pos in manter]
+
+        self._gravar(matrix)
+
+    def update_metadata(self, ids, metadatas):
+        """Troca so os metadados; a matriz, o IVF e os codigos ficam intactos"""
+        if not ids:
+            return
+
+        for i, meta in zip(ids, metadatas):
+            self.metadatas[self._posicoes[i]] = meta or {}
+
+        if self._em_lote:
+            self._pendente = True
+        else:
+            os.replace(self._write_meta(), self._meta_path)
+
+    def _candidatos(self, consulta):
+        if self.centroids is None:
+            return np.arange(len(self.ids))
+
+        proximas = np.argsort(-(self.centroids @ consulta))[:self.nprobe]
+        return np.flatnonzero(np.isin(self.assignments, proximas))
+
+    def _primeira_passada(self, consulta, candidatos, n):
+        """Seleciona os n melhores candidatos usando so os codigos quantizados"""
+        codes = self.codes[candidatos]
+        if self.quantizacao == 'int8':
+            # codes * escala ~= vetor original, entao o score aproximado e codes @ (escala * consulta)
+            aproximados = codes @ (self.escala * consulta)
+        else:
+            aproximados = -hamming(codes, quantizar_binario(consulta[None, :])[0])
+
+        melhores = np.argpartition(-aproximados, n - 1)[:n]
+        return np.sort(candidatos[melhores])
+
+    def query(self, embedding, k=8, where=None):
+        if not self.ids:
+            return []
+
+        consulta = normalizar(embedding)[0]
+        candidatos = self._candidatos(consulta)
+
+        if where:
+            candidatos = np.array([
+                pos for pos in candidatos
+                if all(self.metadatas[pos].get(campo) == valor for campo, valor in where.items())
+            ], dtype=np.int64)
+
+        if len(candidatos) == 0:
+            return []
+
+        if self.codes is not None and len(candidatos) > k * self.rescore:
+            candidatos = self._primeira_passada(consulta, candidatos, k * self.rescore)
+
+        # Reavaliacao exata em float32 (so as linhas candidatas saem do disco)
+        scores = self.matrix[candidatos] @ consulta
+        k = min(k, len(candidatos))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {
+                'id': self.ids[candidatos[j]],
+                'texto': self.documents[candidatos[j]],
+                'metadata': self.metadatas[candidatos[j]],
+                'score': float(scores[j])
+            }
+            for j in top
+        ]
+
+
+BACKENDS = {
+    'chroma': ChromaVectorStore,
+    'numpy': NumpyVectorStore
+}
+
+
+def abrir_vector_store(backend=None, path=None, criar=False):
+    """
+    Abre o backend de busca vetorial configurado.
+
+    Args:
+        backend: 'chroma' ou 'numpy' (padrao: Config.VECTOR_BACKEND)
+        path: Diretorio do indice (padrao: Config.VECTOR_STORE_PATH ou o do backend)
+        criar: Cria o indice se ainda nao existir (usado pelo policy_loader)
+    """
+    backend = (backend or Config.VECTOR_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend vetorial desconhecido: {backend} (use {', '.join(BACKENDS)})")
+
+    path = path or Config.VECTOR_STORE_PATH or CAMINHOS_PADRAO[backend]
+    return BACKENDS[backend](path, criar=criar)
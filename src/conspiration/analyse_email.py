@@ -1,26 +1,85 @@
-from transformers import pipeline
+import os
+import time
+import json
+import bisect
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
 
+from .score_cache import email_key
 
-print("Carregando modelos...")
 
-SENTIMENT_MODEL = pipeline(
-    "sentiment-analysis",
-    model="nlptown/bert-base-multilingual-uncased-sentiment",
-    tokenizer="nlptown/bert-base-multilingual-uncased-sentiment",
-    device=-1
-)
+# Modelos carregados sob demanda (o caminho com cache não precisa deles)
+MODEL_SPECS = {
+    "sentiment": {
+        "task": "sentiment-analysis",
+        "model": "nlptown/bert-base-multilingual-uncased-sentiment",
+        "tokenizer": "nlptown/bert-base-multilingual-uncased-sentiment",
+    },
+    "zero_shot": {
+        "task": "zero-shot-classification",
+        "model": "MoritzLaurer/mDeBERTa-v3-base-mnli-xnli",
+    },
+}
 
-ZERO_SHOT_MODEL = pipeline(
-    "zero-shot-classification",
-    model="MoritzLaurer/mDeBERTa-v3-base-mnli-xnli",
-    device=-1
-)
+# 'torch' (PyTorch eager) ou 'onnx' (ONNX Runtime com int8 dinâmico)
+BACKENDS = ("torch", "onnx")
+SCORING_BACKEND = os.getenv("CONSPIRACY_BACKEND", "torch").lower()
 
-print("Modelos carregados com sucesso!\n")
+_models = {}
+_models_lock = threading.Lock()
 
-def sentiment_pipeline(text: str):
-    result = SENTIMENT_MODEL(text)[0]   
+# Limite de threads intra-op por processo (definido pelo _init_worker)
+_intra_op_threads = None
+
+
+def get_model(name: str, backend: str = None):
+    """Return the `name` pipeline for `backend`, loading it on first use."""
+    backend = backend or SCORING_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend} (use {', '.join(BACKENDS)})")
+
+    model = _models.get((backend, name))
+    if model is None:
+        with _models_lock:
+            model = _models.get((backend, name))
+            if model is None:
+                print(f"Carregando modelo {MODEL_SPECS[name]['model']} ({backend})...")
+                if backend == "onnx":
+                    from .onnx_backend import load_pipeline
+                    model = load_pipeline(name, MODEL_SPECS[name], threads=_intra_op_threads)
+                else:
+                    from transformers import pipeline
+                    model = pipeline(device=-1, **MODEL_SPECS[name])
+                _models[(backend, name)] = model
+    return model
+
+
+def warm_up(names=None, backend: str = None):
+    """Load the models ahead of first use (e.g. before a large batch)."""
+    start = time.perf_counter()
+    for name in names or MODEL_SPECS:
+        get_model(name, backend)
+    print(f"Modelos carregados com sucesso! ({time.perf_counter() - start:.1f}s)\n")
+
+
+TOPIC_LABELS = [
+    "conspiracy", "suspicious", "complaint",
+    "procedural", "work-related", "personal"
+]
+
+def model_version(backend: str = None) -> str:
+    """Changes whenever models, labels or backend change, invalidating cached scores."""
+    backend = backend or SCORING_BACKEND
+    # Mantém a versão original para o PyTorch (scores já cacheados continuam válidos)
+    payload = [MODEL_SPECS, TOPIC_LABELS] if backend == "torch" else [MODEL_SPECS, TOPIC_LABELS, backend]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+MODEL_VERSION = model_version()
+
+def _sentiment_from_result(result):
     stars = int(result["label"][0])
 
     if stars <= 2:
@@ -32,78 +91,326 @@ def sentiment_pipeline(text: str):
 
     return {"label": label, "raw_label": result["label"], "score": result["score"]}
 
+def sentiment_pipeline(text: str):
+    return _sentiment_from_result(get_model("sentiment")(text, truncation=True)[0])
+
 def zero_shot_pipeline(text: str, labels):
-    result = ZERO_SHOT_MODEL(text, candidate_labels=labels, multi_label=True)
+    result = get_model("zero_shot")(text, candidate_labels=labels, multi_label=True)
     return {"labels": result["labels"], "scores": result["scores"]}
 
-def initial_impression_pipeline(emails_json):
-    results = []
+def email_text(email) -> str:
+    return email.get("subject", "") + "\n" + email.get("body", "")
+
+SUSPICION_THRESHOLD = 0.8
+
+SCORE_WEIGHTS = {
+    "sender_flag": 0.35,
+    "mentions_toby": 0.10,
+    "conspiracy": 0.40,
+    "sentiment_neg": 0.15,
+}
 
-    for email in emails_json:
-        subject = email.get("subject", "")
-        body = email.get("body", "")
-        sender = email.get("from", "").lower()
+def cheap_features(email):
+    """Signals that need no model: Michael as sender and mentions of Toby."""
+    return {
+        "sender_flag": 1 if "michael" in email.get("from", "").lower() else 0,
+        "mentions_toby": 1 if "toby" in email_text(email).lower() else 0,
+    }
 
-        text = subject + "\n" + body
+def suspicion_bounds(email):
+    """
+    Lowest and highest suspicion_score the email can reach before running the models.
 
-        sentiment = sentiment_pipeline(text)
-        topics = zero_shot_pipeline(text, [
-            "conspiracy", "suspicious", "complaint",
-            "procedural", "work-related", "personal"
-        ])
+    The model terms (conspiracy score and negative sentiment) are at most 1 each.
+    """
+    features = cheap_features(email)
+    lower = (
+        SCORE_WEIGHTS["sender_flag"] * features["sender_flag"] +
+        SCORE_WEIGHTS["mentions_toby"] * features["mentions_toby"]
+    )
+    return lower, lower + SCORE_WEIGHTS["conspiracy"] + SCORE_WEIGHTS["sentiment_neg"]
 
-        conspiracy_score = topics["scores"][topics["labels"].index("conspiracy")]
-        sentiment_neg = 1 if sentiment["label"] == "NEG" else 0
-        sender_flag = 1 if "michael" in sender else 0
-        mentions_toby = 1 if "toby" in text.lower() else 0
+def build_pruned(email, lower, upper):
+    """Record for an email skipped by the prefilter: no model outputs, only bounds."""
+    return {
+        "id": email["id"],
+        "from": email.get("from", ""),
+        "subject": email.get("subject", ""),
+        "body": email.get("body", ""),
+        "sentiment": None,
+        "topics": None,
+        "pruned": True,
+        "suspicion_upper_bound": upper,
+        "suspicion_score": lower
+    }
 
-        suspicion_score = (
-            0.35 * sender_flag +    
-            0.10 * mentions_toby +
-            0.40 * conspiracy_score +
-            0.15 * sentiment_neg
+def build_score(email, sentiment, topics):
+    """Combine sentiment, topics and cheap signals into the email suspicion_score."""
+    features = cheap_features(email)
+
+    conspiracy_score = topics["scores"][topics["labels"].index("conspiracy")]
+    sentiment_neg = 1 if sentiment["label"] == "NEG" else 0
+
+    suspicion_score = (
+        SCORE_WEIGHTS["sender_flag"] * features["sender_flag"] +
+        SCORE_WEIGHTS["mentions_toby"] * features["mentions_toby"] +
+        SCORE_WEIGHTS["conspiracy"] * conspiracy_score +
+        SCORE_WEIGHTS["sentiment_neg"] * sentiment_neg
+    )
+
+    return {
+        "id": email["id"],
+        "from": email.get("from", ""),
+        "subject": email.get("subject", ""),
+        "body": email.get("body", ""),
+        "sentiment": sentiment,
+        "topics": topics,
+        "suspicion_score": suspicion_score
+    }
+
+def score_texts(texts, batch_size=16, backend: str = None):
+    """
+    Run both models in batches over a list of texts.
+
+    Texts are sorted by length before batching (less padding waste) and the
+    results are returned in the original order.
+
+    Returns:
+        List of (sentiment, topics) aligned with `texts`
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+
+    def sorted_texts():
+        for i in order:
+            yield texts[i]
+
+    sentiments = get_model("sentiment", backend)(sorted_texts(), batch_size=batch_size, truncation=True)
+    topics = get_model("zero_shot", backend)(
+        sorted_texts(), candidate_labels=TOPIC_LABELS, multi_label=True, batch_size=batch_size
+    )
+
+    results = [None] * len(texts)
+    for i, sentiment, topic in zip(order, sentiments, topics):
+        results[i] = (
+            _sentiment_from_result(sentiment),
+            {"labels": topic["labels"], "scores": topic["scores"]}
         )
 
-        results.append({
-            "id": email["id"],
-            "from": email.get("from", ""),
-            "subject": subject,
-            "body": body,
-            "sentiment": sentiment,
-            "topics": topics,
-            "suspicion_score": suspicion_score
-        })
+    return results
+
+def _init_worker(backend, threads):
+    """Runs once per worker process: caps intra-op threads and loads the models."""
+    global _intra_op_threads
+    _intra_op_threads = threads
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    warm_up(backend=backend)
+
+
+def _score_shard(keys, texts, batch_size, backend):
+    return list(zip(keys, score_texts(texts, batch_size=batch_size, backend=backend)))
+
+
+def _shards(missing, shard_size):
+    # Shards formados em ordem de tamanho: cada lote tem textos parecidos (menos padding)
+    items = sorted(missing.items(), key=lambda item: len(item[1]))
+    for i in range(0, len(items), shard_size):
+        shard = items[i:i + shard_size]
+        yield [k for k, _ in shard], [t for _, t in shard]
 
+
+def score_missing(missing, batch_size=16, cache=None, workers=1, shard_size=None):
+    """
+    Score the texts in `missing` (key -> text), shard by shard.
+
+    With workers > 1 the shards are spread over a process pool. Each worker
+    loads the models once and uses cpu_count // workers torch threads. Every
+    finished shard is written to the cache right away, with progress reported.
+
+    Returns:
+        Dict key -> (sentiment, topics)
+    """
+    shard_size = shard_size or batch_size * 8
+    workers = min(max(workers, 1), -(-len(missing) // shard_size))
+    total = len(missing)
+    results = {}
+    start = time.perf_counter()
+
+    def collect(shard_results):
+        if cache:
+            cache.put_many((k, sentiment, topics) for k, (sentiment, topics) in shard_results)
+        results.update(shard_results)
+        elapsed = time.perf_counter() - start
+        print(f"   {len(results)}/{total} emails ({len(results) / max(elapsed, 1e-9):.1f} emails/s)")
+
+    if workers == 1:
+        warm_up()
+        for keys, texts in _shards(missing, shard_size):
+            collect(_score_shard(keys, texts, batch_size, SCORING_BACKEND))
+    else:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        print(f"→ {workers} processos, {threads} threads cada")
+
+        if SCORING_BACKEND == "onnx":
+            # Exporta uma vez aqui; os workers só carregam o modelo pronto do disco
+            from .onnx_backend import export_model
+            for name, spec in MODEL_SPECS.items():
+                export_model(name, spec)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(SCORING_BACKEND, threads)
+        ) as executor:
+            futures = [
+                executor.submit(_score_shard, keys, texts, batch_size, SCORING_BACKEND)
+                for keys, texts in _shards(missing, shard_size)
+            ]
+            for future in as_completed(futures):
+                collect(future.result())
+
+    elapsed = time.perf_counter() - start
+    print(f"→ {total} emails pontuados em {elapsed:.1f}s "
+          f"({total / max(elapsed, 1e-9):.1f} emails/s, batch_size={batch_size}, workers={workers})")
     return results
 
 
+def initial_impression_pipeline(emails_json, batch_size=16, cache=None, workers=1, prune_threshold=None):
+    """
+    Score every email, reusing cached model outputs when a cache is given.
+
+    Args:
+        emails_json: Emails from load_emails
+        batch_size: Batch size for both pipelines
+        cache: Optional ScoreCache; only emails missing from it are scored
+        workers: Processes used for scoring (1 = in this process)
+        prune_threshold: If set, uncached emails whose suspicion_score can never
+            reach it are not sent to the models and come back marked as pruned
+    """
+    texts = [email_text(email) for email in emails_json]
+    keys = [email_key(text, MODEL_VERSION) for text in texts]
+
+    found = cache.get_many(keys, _sentiment_from_result) if cache else {}
+
+    # Textos repetidos são pontuados uma vez só
+    missing = {}
+    pruned = {}
+    for email, key, text in zip(emails_json, keys, texts):
+        if key in found:
+            continue
+        if prune_threshold is not None:
+            lower, upper = suspicion_bounds(email)
+            if upper < prune_threshold:
+                pruned[email["id"]] = (lower, upper)
+                continue
+        missing.setdefault(key, text)
+
+    if pruned:
+        print(f"→ {len(pruned)} emails descartados no pré-filtro (não alcançam {prune_threshold}).")
+
+    if missing:
+        print(f"→ {len(found)} emails no cache, pontuando {len(missing)}...")
+        found.update(score_missing(missing, batch_size=batch_size, cache=cache, workers=workers))
+
+    return [
+        build_score(email, *found[key]) if key in found else build_pruned(email, *pruned[email["id"]])
+        for email, key in zip(emails_json, keys)
+    ]
+
+
 def parse_date(date_str):
     return datetime.strptime(date_str, "%Y-%m-%d %H:%M")
 
 
-def group_suspicious_with_michael_context(emails_json, scores_json, threshold=0.8):
+CONTEXT_WINDOW = timedelta(hours=32)
+MAX_CLUSTER_EMAILS = 30
+
+
+def _michael_timeline(emails_json):
+    """Michael's emails sorted by date, plus the matching list of dates (for bisect)."""
+    michael = sorted(
+        (e for e in emails_json if "michael.scott" in e["from"].lower()),
+        key=lambda e: parse_date(e["date"])
+    )
+    return michael, [parse_date(e["date"]) for e in michael]
+
+
+def _context_between(michael, dates, lower, upper, exclude_ids):
+    first = bisect.bisect_left(dates, lower)
+    last = bisect.bisect_right(dates, upper)
+    return [e for e in michael[first:last] if e["id"] not in exclude_ids]
+
+
+def _trim_context(context, suspects, limit):
+    """Keep the `limit` context emails closest in time to any suspect (date order preserved)."""
+    if len(context) <= limit:
+        return context
+    suspect_dates = [parse_date(s["date"]) for s in suspects]
+
+    def distance(email):
+        date = parse_date(email["date"])
+        return min(abs(date - d) for d in suspect_dates)
+
+    keep = {e["id"] for e in sorted(context, key=distance)[:max(limit, 0)]}
+    return [e for e in context if e["id"] in keep]
+
+
+def group_suspicious_with_michael_context(emails_json, scores_json, threshold=SUSPICION_THRESHOLD,
+                                          window=CONTEXT_WINDOW, max_cluster_emails=MAX_CLUSTER_EMAILS):
+    """
+    Group suspicious emails with Michael's emails from the surrounding ±window.
+
+    Suspicious emails whose windows overlap are merged into one cluster
+    (interval union), so every email appears at most once per cluster.
+    Clusters are capped at `max_cluster_emails` emails: a suspect that would
+    push a cluster over the cap starts a new one. A single suspect with too
+    much context keeps only the context emails closest to it.
+
+    Returns:
+        List of {"suspect_emails", "context_emails", "window_start", "window_end"}
+    """
     email_by_id = {email["id"]: email for email in emails_json}
-    suspicious = [s for s in scores_json if s["suspicion_score"] >= threshold]
+    suspicious = sorted(
+        (email_by_id[s["id"]] for s in scores_json if s["suspicion_score"] >= threshold),
+        key=lambda e: parse_date(e["date"])
+    )
+    michael, dates = _michael_timeline(emails_json)
+
+    def close(suspects, lower, upper):
+        ids = {e["id"] for e in suspects}
+        context = _context_between(michael, dates, lower, upper, ids)
+        return {
+            "suspect_emails": suspects,
+            "context_emails": _trim_context(context, suspects, max_cluster_emails - len(suspects)),
+            "window_start": lower.strftime("%Y-%m-%d %H:%M"),
+            "window_end": upper.strftime("%Y-%m-%d %H:%M")
+        }
 
     groups = []
+    current, lower, upper = [], None, None
 
-    for sus in suspicious:
-        sus_email = email_by_id[sus["id"]]
+    for sus_email in suspicious:
         sus_date = parse_date(sus_email["date"])
+        sus_lower, sus_upper = sus_date - window, sus_date + window
 
-        lower = sus_date - timedelta(hours=32)
-        upper = sus_date + timedelta(hours=32)
+        if current and sus_lower <= upper:
+            merged_upper = max(upper, sus_upper)
+            ids = {e["id"] for e in current} | {sus_email["id"]}
+            size = len(ids) + len(_context_between(michael, dates, lower, merged_upper, ids))
+            if size <= max_cluster_emails:
+                current.append(sus_email)
+                upper = merged_upper
+                continue
 
-        context = []
-        for email in emails_json:
-            if "michael.scott" in email["from"].lower():
-                date = parse_date(email["date"])
-                if lower <= date <= upper:
-                    context.append(email)
+        if current:
+            groups.append(close(current, lower, upper))
+        current, lower, upper = [sus_email], sus_lower, sus_upper
 
-        groups.append({
-            "suspect_email": sus_email,
-            "context_emails": context
-        })
+    if current:
+        groups.append(close(current, lower, upper))
 
     return groups
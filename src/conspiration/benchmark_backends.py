@@ -0,0 +1,74 @@
+import json
+import time
+import argparse
+
+from .load_emails import load_emails
+from .analyse_email import build_score, email_text, score_texts, warm_up
+
+EMAILS_PATH = "data/emails.txt"
+SCORES_CACHE_PATH = "data/scores_cache.json"
+THRESHOLD = 0.8
+
+
+def score_with_backend(emails, backend, batch_size):
+    """Score every email with `backend` and measure throughput (models already loaded)."""
+    texts = [email_text(email) for email in emails]
+
+    start = time.perf_counter()
+    scored = score_texts(texts, batch_size=batch_size, backend=backend)
+    elapsed = time.perf_counter() - start
+
+    results = [build_score(email, *pair) for email, pair in zip(emails, scored)]
+    return results, len(emails) / max(elapsed, 1e-9)
+
+
+def parity(reference, candidate):
+    """Compare ONNX scores with the PyTorch reference stored in scores_cache.json."""
+    by_id = {r["id"]: r for r in reference}
+    pairs = [(by_id[c["id"]], c) for c in candidate if c["id"] in by_id]
+
+    def conspiracy(score):
+        return score["topics"]["scores"][score["topics"]["labels"].index("conspiracy")]
+
+    diffs = [abs(r["suspicion_score"] - c["suspicion_score"]) for r, c in pairs]
+    conspiracy_diffs = [abs(conspiracy(r) - conspiracy(c)) for r, c in pairs]
+    same_sentiment = sum(r["sentiment"]["label"] == c["sentiment"]["label"] for r, c in pairs)
+    same_flag = sum(
+        (r["suspicion_score"] >= THRESHOLD) == (c["suspicion_score"] >= THRESHOLD) for r, c in pairs
+    )
+
+    n = max(len(pairs), 1)
+    return {
+        "emails": len(pairs),
+        "sentiment_agreement": round(same_sentiment / n, 3),
+        "threshold_agreement": round(same_flag / n, 3),
+        "suspicion_mae": round(sum(diffs) / n, 4),
+        "suspicion_max_diff": round(max(diffs, default=0.0), 4),
+        "conspiracy_mae": round(sum(conspiracy_diffs) / n, 4)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Paridade e vazão: PyTorch vs ONNX int8")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--torch", action="store_true", help="Mede também a vazão do PyTorch")
+    args = parser.parse_args(argv)
+
+    emails = load_emails(EMAILS_PATH)
+    with open(SCORES_CACHE_PATH, "r", encoding="utf-8") as f:
+        reference = json.load(f)["scores"]
+
+    backends = ["onnx", "torch"] if args.torch else ["onnx"]
+    for backend in backends:
+        warm_up(backend=backend)
+        results, rate = score_with_backend(emails, backend, args.batch_size)
+        print(f"[{backend}] {rate:.1f} emails/s (batch_size={args.batch_size})")
+
+        if backend == "onnx":
+            print(f"[{backend}] Paridade com {SCORES_CACHE_PATH}:")
+            for key, value in parity(reference, results).items():
+                print(f"    {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,79 @@
 # llm_agent.py
 
 import os
-import re
+import time
+import hashlib
+from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from pydantic import BaseModel, Field, ValidationError
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 
+from .text_utils import strip_reasoning
+
 
 load_dotenv()
 API_KEY = os.getenv("NVIDIA_API_KEY")
+# Endpoint e modelo configuráveis (ex: um servidor local compatível com OpenAI para testes)
+BASE_URL = os.getenv("CONSPIRACY_LLM_BASE_URL", "https://integrate.api.nvidia.com/v1")
+MODEL = os.getenv("CONSPIRACY_LLM_MODEL", "nvidia/llama-3.3-nemotron-super-49b-v1.5")
 
 llm = ChatOpenAI(
-    model="nvidia/llama-3.3-nemotron-super-49b-v1.5",
+    model=MODEL,
     api_key=API_KEY,
-    base_url="https://integrate.api.nvidia.com/v1"
+    base_url=BASE_URL
 )
 
 
-AGENT_PROMPT = ChatPromptTemplate.from_messages([
-    (
-        "system",
-        """
+class Evidence(BaseModel):
+    type: str = ""
+    quote: str = ""
+    reason: str = ""
+    email_id: Optional[int] = None
+
+
+class Profiles(BaseModel):
+    michael: str = ""
+    toby: str = ""
+    others: List[str] = Field(default_factory=list)
+
+
+class ClusterAnalysis(BaseModel):
+    """Structured result of one cluster analysis."""
+    narrative: str
+    evidence: List[Evidence] = Field(default_factory=list)
+    profiles: Profiles = Field(default_factory=Profiles)
+    cluster_conclusion: str
+    suspect_ids: List[int] = Field(default_factory=list)
+
+    def to_report_text(self, index: int = None) -> str:
+        """Compact text with only the structured fields (input of the report stage)."""
+        title = f"[Cluster #{index}]" if index is not None else "[Cluster]"
+        if self.suspect_ids:
+            title += f" Emails suspeitos: {', '.join(map(str, self.suspect_ids))}"
+
+        lines = [title, f"Conclusion: {self.cluster_conclusion}", f"Narrative: {self.narrative}"]
+        if self.evidence:
+            lines.append("Evidence:")
+            for item in self.evidence:
+                source = f"email {item.email_id}, " if item.email_id is not None else ""
+                lines.append(f"- ({source}{item.type}) \"{item.quote}\" — {item.reason}")
+        lines.append(f"Profiles: Michael: {self.profiles.michael} | Toby: {self.profiles.toby}")
+        if self.profiles.others:
+            lines.append(f"Others: {'; '.join(self.profiles.others)}")
+        return "\n".join(lines)
+
+
+AGENT_INSTRUCTIONS = """
         You are an AI Investigation Agent.
 
         TASK CONTEXT:
         Toby suspects that Michael Scott is conspiring against him.
         Your job is to analyze emails and determine whether this conspiracy is real.
 
-        For each cluster of emails (one suspicious email + contextual emails), you must:
+        For each cluster of emails (one or more suspicious emails + contextual emails), you must:
 
         1. Produce a **narrative explanation** of what seems to be happening.
         2. Extract **evidence**, including quotes, timestamps, tone, and relevance.
@@ -42,7 +87,7 @@ AGENT_PROMPT = ChatPromptTemplate.from_messages([
         - Make the analysis concise but thorough.
         - Assume the reader is a human investigator.
 
-        Return the output in this structure:
+        Return ONLY a JSON object (no markdown, no extra text) in this structure:
 
         {{
             "narrative": "...",
@@ -50,7 +95,8 @@ AGENT_PROMPT = ChatPromptTemplate.from_messages([
                 {{
                     "type": "...",
                     "quote": "...",
-                    "reason": "..."
+                    "reason": "...",
+                    "email_id": 0
                 }}
             ],
             "profiles": {{
@@ -61,30 +107,73 @@ AGENT_PROMPT = ChatPromptTemplate.from_messages([
             "cluster_conclusion": "..."
         }}
         """
-    ),
+
+AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", AGENT_INSTRUCTIONS),
     ("human", "{cluster_text}")
 ])
 
+# Análises por cluster, endereçadas pelo conteúdo do cluster (IDs + textos dos emails)
+ANALYSIS_CACHE_DIR = os.getenv("CONSPIRACY_ANALYSIS_CACHE", "src/conspiration/output/analysis_cache")
+
+REPAIR_PROMPT = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        """
+        The text below should be a JSON object with the keys "narrative" (string),
+        "evidence" (list of {{"type", "quote", "reason", "email_id"}}),
+        "profiles" ({{"michael", "toby", "others": [...]}}) and "cluster_conclusion" (string),
+        but it failed validation with this error:
+
+        {error}
+
+        Rewrite it as valid JSON with exactly that structure, keeping its content.
+        Return ONLY the JSON object.
+        """
+    ),
+    ("human", "{raw_output}")
+])
+
+
+def parse_analysis(text: str) -> ClusterAnalysis:
+    """Extract and validate the JSON object in an LLM answer (fences and <think> blocks are ignored)."""
+    cleaned = strip_reasoning(text)
+    start, end = cleaned.find("{"), cleaned.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("nenhum objeto JSON na resposta")
+    return ClusterAnalysis.model_validate_json(cleaned[start:end + 1])
+
 
 
 def analyze_cluster_with_agent(cluster):
     """
+    Returns a validated ClusterAnalysis. If the answer does not match the
+    schema, the LLM is asked once to repair it; a second failure raises.
+    Successful analyses are cached on disk by a hash of the cluster's email
+    IDs and contents, so unchanged clusters are not sent to the LLM again.
+
     cluster = {
-        "suspect_email": {...},
+        "suspect_emails": [{...}, ...],
         "context_emails": [...]
     }
+
+    Each email appears once per cluster; a suspicious email sent by Michael
+    is not repeated among the context emails.
     """
 
     # format cluster as plain text
     lines = []
 
-    s = cluster["suspect_email"]
-    lines.append("=== SUSPICIOUS EMAIL ===")
-    lines.append(f"ID: {s['id']}")
-    lines.append(f"From: {s['from']}")
-    lines.append(f"Date: {s['date']}")
-    lines.append(f"Subject: {s['subject']}")
-    lines.append(f"Body:\n{s['body']}\n")
+    suspects = cluster.get("suspect_emails") or [cluster["suspect_email"]]
+    lines.append("=== SUSPICIOUS EMAILS ===" if len(suspects) > 1 else "=== SUSPICIOUS EMAIL ===")
+    for s in suspects:
+        if len(suspects) > 1:
+            lines.append("--------------------------")
+        lines.append(f"ID: {s['id']}")
+        lines.append(f"From: {s['from']}")
+        lines.append(f"Date: {s['date']}")
+        lines.append(f"Subject: {s['subject']}")
+        lines.append(f"Body:\n{s['body']}\n")
 
     lines.append("=== CONTEXT EMAILS ===")
     for ctx in cluster["context_emails"]:
@@ -97,13 +186,78 @@ def analyze_cluster_with_agent(cluster):
 
     cluster_text = "\n".join(lines)
 
+    # Mesmo cluster (mesmos emails), mesmo modelo e prompt: reaproveita a análise.
+    # Isso também mantém estáveis as chaves do cache de resumos do relatório.
+    digest = hashlib.sha256(
+        "\n".join([MODEL, AGENT_INSTRUCTIONS, cluster_text]).encode("utf-8")
+    ).hexdigest()
+    cache_path = os.path.join(ANALYSIS_CACHE_DIR, f"{digest}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return ClusterAnalysis.model_validate_json(f.read())
+
     # call the LLM
     response = llm.invoke(
         AGENT_PROMPT.format(cluster_text=cluster_text)
     )
 
-    cleaned_content = re.sub(
-        r"<think>.*?</think>", "", response.content, flags=re.DOTALL
-    ).strip()
+    try:
+        analysis = parse_analysis(response.content)
+    except (ValueError, ValidationError) as e:
+        # Uma tentativa de conserto: o próprio LLM reescreve a saída no schema
+        repaired = llm.invoke(
+            REPAIR_PROMPT.format(error=str(e), raw_output=strip_reasoning(response.content))
+        )
+        analysis = parse_analysis(repaired.content)
+
+    analysis.suspect_ids = [s["id"] for s in suspects]
+
+    os.makedirs(ANALYSIS_CACHE_DIR, exist_ok=True)
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(analysis.model_dump_json())
+    os.replace(tmp, cache_path)
+
+    return analysis
+
+
+def _analyze_with_retry(idx, cluster, retries):
+    for attempt in range(retries + 1):
+        try:
+            print(f"Analisando cluster #{idx}...")
+            return analyze_cluster_with_agent(cluster)
+        except Exception as e:
+            if attempt == retries:
+                print(f"Cluster #{idx} falhou após {retries + 1} tentativas: {e}")
+                return ClusterAnalysis(
+                    narrative=f"Análise indisponível: {e}",
+                    cluster_conclusion="Inconclusivo (falha na análise).",
+                    suspect_ids=[s["id"] for s in cluster.get("suspect_emails") or [cluster["suspect_email"]]]
+                )
+            wait = 2 ** attempt
+            print(f"Cluster #{idx} falhou ({e}); nova tentativa em {wait}s...")
+            time.sleep(wait)
+
+
+def analyze_clusters(clusters, max_concurrency=4, retries=2):
+    """
+    Analyze several clusters concurrently.
+
+    At most `max_concurrency` requests are in flight at once. Each cluster is
+    retried on its own (exponential backoff), and the results keep the order
+    of `clusters`. A cluster that keeps failing yields a ClusterAnalysis with
+    a failure note instead of aborting the whole run.
+    """
+    if not clusters:
+        return []
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(clusters)))) as executor:
+        results = list(executor.map(
+            lambda item: _analyze_with_retry(item[0], item[1], retries),
+            enumerate(clusters, start=1)
+        ))
 
-    return cleaned_content
+    print(f"→ {len(clusters)} clusters analisados em {time.perf_counter() - start:.1f}s "
+          f"(concorrência {max_concurrency})")
+    return results
@@ -1,43 +1,25 @@
-import os, hashlib, json
+import os
+import json
 from dotenv import load_dotenv
 
 from .load_emails import load_emails
 from .analyse_email import (
+    MODEL_VERSION,
+    SCORING_BACKEND,
+    SUSPICION_THRESHOLD,
+    TOPIC_LABELS,
+    email_text,
     initial_impression_pipeline,
     group_suspicious_with_michael_context
 )
-from .llm_agent import analyze_cluster_with_agent
+from .score_cache import ScoreCache
+from .llm_agent import analyze_clusters
 from .report_generator import generate_final_report
 
-def hash_file(path: str) -> str:
-    """
-    Returns SHA256 hash of the file content.
-    Used to detect if emails.txt changed.
-    """
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        while chunk := f.read(8192):
-            h.update(chunk)
-    return h.hexdigest()
-
+# Cache por email (SQLite); o JSON antigo só serve de semente na primeira execução
+SCORES_DB_PATH = "data/scores_cache.sqlite"
 SCORES_CACHE_PATH = "data/scores_cache.json"
-
-
-def load_cache(path: str):
-    """Load JSON cache file if it exists."""
-    if not os.path.exists(path):
-        return None
-
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def save_cache(path: str, data: dict):
-    """Save cache file to 'data/' directory."""
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+CLUSTER_ANALYSES_PATH = "src/conspiration/output/cluster_analyses.json"
 
 def main():
 
@@ -54,43 +36,52 @@ def main():
     emails = load_emails(emails_path)
     print(f"→ {len(emails)} emails carregados.")
 
-    # Hash do arquivo para saber se mudou
-    emails_hash = hash_file(emails_path)
-
     print("\nVerificando cache de classificação...")
-    cache = load_cache(SCORES_CACHE_PATH)
-
-    if cache and cache["emails_hash"] == emails_hash:
-        print("Cache válido encontrado! Pulando classificação inicial.")
-        scores_json = cache["scores"]
-    else:
-        print("Cache inexistente ou inválido. Recalculando scoring completo...")
-        scores_json = initial_impression_pipeline(emails)
-
-        save_cache(SCORES_CACHE_PATH, {
-            "emails_hash": emails_hash,
-            "scores": scores_json
-        })
-
-        print("Scores salvos em cache.")
+    cache = ScoreCache(SCORES_DB_PATH, TOPIC_LABELS)
+    # O JSON antigo foi gerado com PyTorch: só serve de semente para esse backend
+    if cache.count() == 0 and SCORING_BACKEND == "torch":
+        imported = cache.import_legacy_json(SCORES_CACHE_PATH, MODEL_VERSION, email_text)
+        if imported:
+            print(f"→ {imported} scores importados de {SCORES_CACHE_PATH}.")
+
+    batch_size = int(os.getenv("CONSPIRACY_BATCH_SIZE", "16"))
+    # 0 = um processo por núcleo
+    workers = int(os.getenv("CONSPIRACY_WORKERS", "1")) or os.cpu_count() or 1
+    # Pré-filtro: pula os modelos para emails que nunca chegam ao limiar
+    prune = os.getenv("CONSPIRACY_PRUNE", "1") != "0"
+    scores_json = initial_impression_pipeline(
+        emails, batch_size=batch_size, cache=cache, workers=workers,
+        prune_threshold=SUSPICION_THRESHOLD if prune else None
+    )
+
+    stats = cache.stats()
+    print(f"→ Cache de scores: {stats['hits']} reaproveitados, {stats['misses']} novos "
+          f"({stats['entries']} entradas, {stats['size_bytes'] / 1024:.0f} KB).")
+    cache.close()
 
     print("\nDetectando clusters suspeitos...")
-    clusters = group_suspicious_with_michael_context(emails, scores_json)
-    print(f"→ {len(clusters)} clusters detectados.")
+    clusters = group_suspicious_with_michael_context(emails, scores_json, SUSPICION_THRESHOLD)
+    suspects = sum(len(c["suspect_emails"]) for c in clusters)
+    print(f"→ {len(clusters)} clusters detectados ({suspects} emails suspeitos).")
 
     if len(clusters) == 0:
         print("\nNenhuma suspeita encontrada. Encerrando.")
         return
 
     print("\nRodando LLM para cada cluster...")
-    cluster_reports = []
-    for idx, cluster in enumerate(clusters, start=1):
-        print(f"Analisando cluster #{idx}...")
-        analysis = analyze_cluster_with_agent(cluster)
-        cluster_reports.append(analysis)
+    max_concurrency = int(os.getenv("CONSPIRACY_LLM_CONCURRENCY", "4"))
+    retries = int(os.getenv("CONSPIRACY_LLM_RETRIES", "2"))
+    cluster_analyses = analyze_clusters(clusters, max_concurrency=max_concurrency, retries=retries)
+
+    # Saída estruturada por cluster (agregável por outras ferramentas)
+    os.makedirs(os.path.dirname(CLUSTER_ANALYSES_PATH), exist_ok=True)
+    with open(CLUSTER_ANALYSES_PATH, "w", encoding="utf-8") as f:
+        json.dump([a.model_dump() for a in cluster_analyses], f, indent=2, ensure_ascii=False)
 
     print("\nGerando relatório final...")
-    final_report = generate_final_report(cluster_reports)
+    # O relatório recebe só os campos estruturados, em formato compacto
+    cluster_reports = [a.to_report_text(idx) for idx, a in enumerate(cluster_analyses, start=1)]
+    final_report = generate_final_report(cluster_reports, max_concurrency=max_concurrency)
 
     print("\n================ RELATÓRIO FINAL =====================\n")
     print(final_report)
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+
+# Modelos exportados (ONNX + int8 dinâmico) ficam em disco e são reaproveitados
+ONNX_CACHE_DIR = os.getenv("CONSPIRACY_ONNX_DIR", "data/onnx_models")
+QUANTIZED_FILE = "model_quantized.onnx"
+
+
+def export_dir(name: str) -> str:
+    return os.path.join(ONNX_CACHE_DIR, name)
+
+
+def export_model(name: str, spec: dict) -> str:
+    """
+    Export a Hugging Face classifier to ONNX and quantize it to int8 (dynamic).
+
+    The export is skipped when the quantized graph is already cached on disk.
+    It is written to a temporary directory and moved into place with
+    os.replace, so concurrent processes never see a half-written model.
+
+    Returns:
+        Directory with the quantized model and its tokenizer
+    """
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    target = export_dir(name)
+    if os.path.exists(os.path.join(target, QUANTIZED_FILE)):
+        return target
+
+    print(f"Exportando {spec['model']} para ONNX em {target}...")
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f".{name}.", dir=ONNX_CACHE_DIR)
+
+    try:
+        model = ORTModelForSequenceClassification.from_pretrained(spec["model"], export=True)
+        model.save_pretrained(tmp)
+        AutoTokenizer.from_pretrained(spec.get("tokenizer", spec["model"])).save_pretrained(tmp)
+
+        # Quantização dinâmica: pesos em int8, ativações quantizadas em tempo de execução
+        quantizer = ORTQuantizer.from_pretrained(tmp)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=tmp, quantization_config=qconfig)
+
+        # Sobra de uma exportação antiga interrompida (sem o grafo quantizado)
+        if os.path.isdir(target) and not os.path.exists(os.path.join(target, QUANTIZED_FILE)):
+            shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            # Outro processo terminou a mesma exportação antes: usa a dele
+            if not os.path.exists(os.path.join(target, QUANTIZED_FILE)):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return target
+
+
+def load_pipeline(name: str, spec: dict, threads: int = None):
+    """
+    Build a transformers pipeline on top of the quantized ONNX graph.
+
+    Args:
+        threads: Caps ONNX Runtime intra-op threads (None keeps its default,
+            one per core), so parallel worker processes don't oversubscribe the CPU
+    """
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from transformers import AutoTokenizer, pipeline
+
+    session_options = None
+    if threads:
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+
+    target = export_model(name, spec)
+    model = ORTModelForSequenceClassification.from_pretrained(
+        target, file_name=QUANTIZED_FILE, session_options=session_options
+    )
+    tokenizer = AutoTokenizer.from_pretrained(target)
+
+    return pipeline(spec["task"], model=model, tokenizer=tokenizer)
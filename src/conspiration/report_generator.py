@@ -3,15 +3,21 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from .text_utils import strip_reasoning
+
 load_dotenv()
 API_KEY = os.getenv("NVIDIA_API_KEY")
+BASE_URL = os.getenv("CONSPIRACY_LLM_BASE_URL", "https://integrate.api.nvidia.com/v1")
+MODEL = os.getenv("CONSPIRACY_LLM_MODEL", "nvidia/llama-3.3-nemotron-super-49b-v1.5")
 
 llm = ChatOpenAI(
-    model="nvidia/llama-3.3-nemotron-super-49b-v1.5",
+    model=MODEL,
     api_key=API_KEY,
-    base_url="https://integrate.api.nvidia.com/v1"
+    base_url=BASE_URL
 )
 
 
@@ -38,11 +44,119 @@ REPORT_PROMPT = ChatPromptTemplate.from_messages([
 ])
 
 
-def generate_final_report(cluster_analysis_texts):
-    joined = "\n\n====== CLUSTER BREAK ======\n\n".join(cluster_analysis_texts)
+SUMMARY_INSTRUCTIONS = """
+        You are consolidating partial results of an investigation into whether
+        Michael Scott is conspiring against Toby Flenderson.
+
+        Merge the analyses provided into ONE intermediate summary that keeps:
+        - the key events in chronological order;
+        - every piece of evidence with its email ID, a short quote and why it matters;
+        - observations about each person involved;
+        - the partial conclusion of each analysis.
+
+        Do not add facts that are not in the input. Be compact.
+        """
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SUMMARY_INSTRUCTIONS),
+    ("human", "{cluster_analyses}")
+])
+
+CLUSTER_BREAK = "\n\n====== CLUSTER BREAK ======\n\n"
+
+# Orçamento de tokens por chamada e cache das sínteses intermediárias
+REPORT_TOKEN_BUDGET = int(os.getenv("CONSPIRACY_REPORT_TOKENS", "6000"))
+SUMMARY_CACHE_DIR = os.getenv("CONSPIRACY_SUMMARY_CACHE", "src/conspiration/output/summary_cache")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def pack_batches(texts, token_budget):
+    """
+    Greedily group consecutive texts into batches that fit the token budget.
+
+    Order is preserved, so appending a new cluster only changes the last batch.
+    A text larger than the budget goes in a batch of its own.
+    """
+    batches, current, used = [], [], 0
+    for text in texts:
+        cost = estimate_tokens(text)
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _cache_path(batch):
+    digest = hashlib.sha256(
+        "\n".join([MODEL, SUMMARY_INSTRUCTIONS, *batch]).encode("utf-8")
+    ).hexdigest()
+    return os.path.join(SUMMARY_CACHE_DIR, f"{digest}.txt")
+
+
+def summarize_batch(batch):
+    """Summarize one batch of analyses, reusing the cached result for identical input."""
+    path = _cache_path(batch)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    response = llm.invoke(
+        SUMMARY_PROMPT.format(cluster_analyses=CLUSTER_BREAK.join(batch))
+    )
+    # Blocos <think> não sobem na árvore nem vão para o cache
+    summary = strip_reasoning(response.content)
+
+    os.makedirs(SUMMARY_CACHE_DIR, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(summary)
+    os.replace(tmp, path)
+
+    return summary
+
+
+def reduce_analyses(texts, token_budget=None, max_concurrency=4, max_levels=5):
+    """
+    Hierarchically reduce analyses until they fit in a single request.
+
+    Each level packs the texts into token-budgeted batches, summarizes the
+    batches in parallel and feeds the summaries to the next level.
+    """
+    token_budget = token_budget or REPORT_TOKEN_BUDGET
+    level = list(texts)
+
+    for depth in range(1, max_levels + 1):
+        if len(level) <= 1 or sum(estimate_tokens(t) for t in level) <= token_budget:
+            break
+
+        batches = pack_batches(level, token_budget)
+        print(f"→ Nível {depth}: {len(level)} textos em {len(batches)} lotes...")
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(batches)))) as executor:
+            level = list(executor.map(summarize_batch, batches))
+
+    return level
+
+
+def generate_final_report(cluster_analysis_texts, token_budget=None, max_concurrency=4):
+    """
+    Final report over all cluster analyses.
+
+    Analyses that do not fit in one request are first reduced
+    hierarchically (map-reduce), with intermediate summaries cached by content.
+    """
+    reduced = reduce_analyses(cluster_analysis_texts, token_budget, max_concurrency)
+    joined = CLUSTER_BREAK.join(reduced)
 
     response = llm.invoke(
         REPORT_PROMPT.format(cluster_analyses=joined)
     )
 
-    return response.content
+    return strip_reasoning(response.content)
@@ -0,0 +1,147 @@
+import os
+import json
+import struct
+import sqlite3
+import hashlib
+import threading
+
+
+def normalize_text(text: str) -> str:
+    """Text used in the key: collapsed whitespace only (the models are case-sensitive)."""
+    return " ".join(text.split())
+
+
+def email_key(text: str, version: str) -> str:
+    """Cache key: hash of the normalized email text plus the model/label version."""
+    return hashlib.sha256(f"{version}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """
+    Per-email score cache backed by SQLite.
+
+    Each row stores only the model outputs for one text (sentiment label and
+    score, plus the topic scores packed as float32), addressed by the hash of
+    the content. Only new or edited emails need to be scored again.
+    """
+
+    def __init__(self, path: str, labels):
+        self.path = path
+        self.labels = list(labels)
+        self._format = f"<{len(self.labels)}f"
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                key TEXT PRIMARY KEY,
+                raw_label TEXT NOT NULL,
+                sentiment_score REAL NOT NULL,
+                topic_scores BLOB NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        self.conn.commit()
+
+    def _decode(self, raw_label, sentiment_score, blob, sentiment_from_label):
+        scores = struct.unpack(self._format, blob)
+        topics = sorted(zip(self.labels, scores), key=lambda x: x[1], reverse=True)
+        sentiment = sentiment_from_label({"label": raw_label, "score": sentiment_score})
+        return sentiment, {
+            "labels": [label for label, _ in topics],
+            "scores": [score for _, score in topics]
+        }
+
+    def get_many(self, keys, sentiment_from_label):
+        """
+        Look up stored scores.
+
+        Args:
+            keys: email_key values to look up
+            sentiment_from_label: Turns a raw {'label', 'score'} into the sentiment dict
+
+        Returns:
+            Dict key -> (sentiment, topics) with only the keys that were found
+        """
+        found = {}
+        keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            # Limite de variáveis do SQLite: consulta em blocos
+            for i in range(0, len(keys), 500):
+                block = keys[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, raw_label, sentiment_score, topic_scores FROM scores "
+                    f"WHERE key IN ({','.join('?' * len(block))})",
+                    block
+                ).fetchall()
+                for key, raw_label, sentiment_score, blob in rows:
+                    found[key] = self._decode(raw_label, sentiment_score, blob, sentiment_from_label)
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+        return found
+
+    def put_many(self, items):
+        """Store [(key, sentiment, topics)] in a single transaction."""
+        rows = []
+        for key, sentiment, topics in items:
+            by_label = dict(zip(topics["labels"], topics["scores"]))
+            blob = struct.pack(self._format, *(by_label[label] for label in self.labels))
+            rows.append((key, sentiment["raw_label"], sentiment["score"], blob))
+
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO scores (key, raw_label, sentiment_score, topic_scores) "
+                "VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+
+    def import_legacy_json(self, path: str, version: str, text_of) -> int:
+        """
+        Seed the cache from the old whole-file scores_cache.json.
+
+        Args:
+            path: Path of the legacy JSON file
+            version: Current model/label version
+            text_of: Builds the scored text from a JSON entry
+
+        Returns:
+            Number of imported scores
+        """
+        if not os.path.exists(path):
+            return 0
+
+        with open(path, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+
+        items = [
+            (email_key(text_of(entry), version), entry["sentiment"], entry["topics"])
+            for entry in legacy.get("scores", [])
+        ]
+        self.put_many(items)
+        return len(items)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": self.count(),
+            "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
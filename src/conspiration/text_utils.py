@@ -0,0 +1,6 @@
+import re
+
+
+def strip_reasoning(text: str) -> str:
+    """Remove the <think>...</think> blocks emitted by the reasoning model."""
+    return re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL).strip()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Servico HTTP local do agente de auditoria.
+
+Mantem um unico ComplianceAgentLangChain carregado (CSV, emails e cliente
+Gemini) e atende varias consultas sem pagar o custo de inicializacao a cada
+sessao. As chamadas pesadas rodam em um pool de workers. Como o agente e
+compartilhado entre clientes, ele nao guarda historico de conversa.
+
+Endpoints:
+    GET  /health  -> status do servico e estatisticas do cache de emails
+    POST /query   -> {"question": "..."}
+    POST /batch   -> {"questions": ["...", "..."]}
+
+Execute de dentro da pasta src/microservices:
+    python audit_service.py --port 8080 --workers 8
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Adiciona o diretorio src ao path (subindo 1 nivel)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from compliance_tools_langchain import ComplianceToolsLangChain
+from compliance_agent_langchain import ComplianceAgentLangChain
+
+
+class AuditService:
+    """Agente aquecido + pool de workers compartilhado entre as requisicoes"""
+
+    def __init__(self, workers: int = 4):
+        inicio = time.perf_counter()
+
+        self.tools = ComplianceToolsLangChain()
+        self.agent = ComplianceAgentLangChain(tools_instance=self.tools, remember=False)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.workers = workers
+
+        self.started_at = time.time()
+        self.startup_seconds = time.perf_counter() - inicio
+        self.total_queries = 0
+        self._lock = threading.Lock()
+
+    def _count(self, n: int):
+        with self._lock:
+            self.total_queries += n
+
+    def query(self, question: str) -> str:
+        """Executa uma pergunta no pool e espera o resultado"""
+        self._count(1)
+        return self.executor.submit(self.agent.query, question).result()
+
+    def batch(self, questions: list) -> list:
+        """Executa varias perguntas em lote, agrupando chamadas repetidas"""
+        self._count(len(questions))
+        # Usa o pool do servico: lotes concorrentes dividem os mesmos workers
+        return self.agent.query_many(questions, executor=self.executor)
+
+    def health(self) -> dict:
+        with self._lock:
+            total_queries = self.total_queries
+        return {
+            'status': 'ok',
+            'uptime_segundos': round(time.time() - self.started_at, 1),
+            'startup_segundos': round(self.startup_seconds, 2),
+            'workers': self.workers,
+            'total_consultas': total_queries,
+            'transacoes_carregadas': len(self.tools.df),
+            'emails_carregados': len(self.tools.email_parser.emails),
+            'cache_contexto': self.tools.email_parser.cache_info(),
+            'latencias': self.agent.get_latency_stats()
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def make_handler(service: AuditService):
+    class AuditRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get('Content-Length', 0))
+            if not length:
+                return {}
+            payload = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(payload, dict):
+                raise ValueError('o corpo deve ser um objeto JSON')
+            return payload
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, service.health())
+            else:
+                self._send_json(404, {'erro': f'Rota nao encontrada: {self.path}'})
+
+        def do_POST(self):
+            try:
+                payload = self._read_json()
+            except (ValueError, UnicodeDecodeError) as e:
+                self._send_json(400, {'erro': f'JSON invalido: {e}'})
+                return
+
+            if self.path == '/query':
+                question = payload.get('question')
+                if not isinstance(question, str) or not question.strip():
+                    self._send_json(400, {'erro': 'Campo "question" obrigatorio (texto nao vazio)'})
+                    return
+                question = question.strip()
+
+                inicio = time.perf_counter()
+                answer = service.query(question)
+                self._send_json(200, {
+                    'question': question,
+                    'answer': answer,
+                    'latencia_ms': round((time.perf_counter() - inicio) * 1000, 1)
+                })
+
+            elif self.path == '/batch':
+                questions = payload.get('questions')
+                if not isinstance(questions, list) or not questions:
+                    self._send_json(400, {'erro': 'Campo "questions" deve ser uma lista nao vazia'})
+                    return
+                if not all(isinstance(q, str) and q.strip() for q in questions):
+                    self._send_json(400, {'erro': 'Todos os itens de "questions" devem ser textos nao vazios'})
+                    return
+
+                inicio = time.perf_counter()
+                answers = service.batch(questions)
+                self._send_json(200, {
+                    'results': [
+                        {'question': q, 'answer': a}
+                        for q, a in zip(questions, answers)
+                    ],
+                    'latencia_ms': round((time.perf_counter() - inicio) * 1000, 1)
+                })
+
+            else:
+                self._send_json(404, {'erro': f'Rota nao encontrada: {self.path}'})
+
+        def log_message(self, format, *args):
+            print(f"[audit_service] {self.address_string()} - {format % args}")
+
+    return AuditRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servico HTTP do agente de auditoria')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=4, help='Tamanho do pool de workers')
+    args = parser.parse_args()
+
+    print("Carregando agente de auditoria (CSV, emails e Gemini)...")
+    service = AuditService(workers=args.workers)
+    print(f"Agente carregado em {service.startup_seconds:.2f}s")
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"Servico de auditoria ouvindo em http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nEncerrando servico de auditoria.")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,40 @@
 import os
-from typing import List, Dict, Any
+import sys
+import time
+import json
+import argparse
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 from utils.config import Config
 from compliance_tools_langchain import ComplianceToolsLangChain
+from intent_router import IntentRouter
+from conversation_memory import ConversationMemory
+
+# Intencoes que exigem um ID de transacao na pergunta
+MISSING_TX_MESSAGES = {
+    'aprovacao': "Por favor, especifique o ID da transacao (ex: TX_1296)",
+    'refeicao': "Por favor, especifique o ID da transacao (ex: TX_1006)",
+    'contexto': "Por favor, especifique o ID da transacao"
+}
+
+FALLBACK_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """Voce e um agente de auditoria de compliance da Dunder Mifflin.
+    Voce pode ajudar com:
+    1. Verificar aprovacao de transacoes (use: "Verifique a aprovacao da transacao TX_XXXX")
+    2. Detectar fraudes via email (use: "Detecte fraudes combinadas")
+    3. Validar refeicoes corporativas (use: "Valide a refeicao da transacao TX_XXXX")
+    4. Obter contexto de transacoes (use: "Analise o contexto da transacao TX_XXXX")
+    """),
+    ("human", "{input}")
+])
 
 class ComplianceAgentLangChain:
-    def __init__(self):
+    def __init__(self, tools_instance: Optional[ComplianceToolsLangChain] = None, remember: bool = True):
         Config.validate()
         
         self.llm = ChatGoogleGenerativeAI(
@@ -17,8 +44,17 @@ class ComplianceAgentLangChain:
             convert_system_message_to_human=True
         )
         
-        self.tools_instance = ComplianceToolsLangChain()
-        self.chat_history = []
+        # Permite reaproveitar uma instancia ja carregada (ex: audit_service)
+        self.tools_instance = tools_instance or ComplianceToolsLangChain()
+        self.fallback_chain = FALLBACK_PROMPT | self.llm
+        self.router = IntentRouter()
+        self.memory = ConversationMemory()
+        # Servico multi-cliente (audit_service) nao guarda historico compartilhado
+        self.remember = remember
+        
+        # Latencia acumulada (segundos, chamadas), separada do roteamento
+        self.latency = {'ferramenta': [0.0, 0], 'llm': [0.0, 0]}
+        self._latency_lock = threading.Lock()
     
     def _get_available_commands(self) -> str:
         """Retorna lista de comandos disponíveis"""
@@ -30,6 +66,62 @@ class ComplianceAgentLangChain:
         4. Obter contexto: "Analise o contexto da transacao TX_XXXX"
         """
     
+    def _route(self, question: str) -> Tuple[str, Optional[str]]:
+        """
+        Identifica a intencao da pergunta e o ID da transacao mencionado.
+        
+        Returns:
+            Tupla (intencao, tx_id). Intencao 'llm' indica resposta generica.
+        """
+        route = self.router.route(question)
+        return route['intent'], route['tx_id']
+    
+    def _run_tool(self, intent: str, tx_id: Optional[str]) -> str:
+        """Executa a ferramenta correspondente a intencao"""
+        if intent == 'aprovacao':
+            return self.tools_instance.audit_transaction_approval(tx_id)
+        if intent == 'fraudes':
+            return self.tools_instance.detect_email_based_fraud("")
+        if intent == 'refeicao':
+            return self.tools_instance.validate_business_meal(tx_id)
+        if intent == 'contexto':
+            return self.tools_instance.get_transaction_context(tx_id)
+        raise ValueError(f"Intencao desconhecida: {intent}")
+    
+    def _timed(self, kind: str, func, *args):
+        inicio = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            duracao = time.perf_counter() - inicio
+            with self._latency_lock:
+                self.latency[kind][0] += duracao
+                self.latency[kind][1] += 1
+    
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """
+        Retorna latencias medias de roteamento, ferramentas e LLM.
+        
+        Returns:
+            Dict com estatisticas do roteador e medias em ms
+        """
+        stats = {'roteamento': self.router.get_stats()}
+        with self._latency_lock:
+            latency = {kind: tuple(valores) for kind, valores in self.latency.items()}
+        for kind, (total, count) in latency.items():
+            stats[kind] = {
+                'chamadas': count,
+                'latencia_media_ms': round(total / count * 1000, 1) if count else 0.0
+            }
+        return stats
+    
+    def _remember(self, question: str, result: str, intent: str = 'llm', tx_id: Optional[str] = None):
+        if not self.remember:
+            return
+        # Saidas de ferramentas entram na memoria apenas como referencia compacta
+        tool = None if intent == 'llm' else intent
+        self.memory.add_turn(question, result, tool=tool, tx_id=tx_id)
+    
     def query(self, question: str) -> str:
         """
         Processa uma pergunta do usuario de forma simplificada.
@@ -42,92 +134,155 @@ class ComplianceAgentLangChain:
             Resposta do agente
         """
         try:
-            question_lower = question.lower()
-            
-            # Identifica qual ferramenta usar baseado em palavras-chave
-            if "aprovacao" in question_lower or "aprovar" in question_lower:
-                # Extrai ID da transação
-                import re
-                tx_id_match = re.search(r'TX_\d+', question, re.IGNORECASE)
-                if tx_id_match:
-                    tx_id = tx_id_match.group()
-                    result = self.tools_instance.audit_transaction_approval(tx_id)
-                    self.chat_history.append(f"User: {question}")
-                    self.chat_history.append(f"Agent: {result}")
-                    return result
-                else:
-                    return "Por favor, especifique o ID da transacao (ex: TX_1296)"
+            intent, tx_id = self._route(question)
             
-            elif ("fraude" in question_lower or "fraud" in question_lower) and ("combinada" in question_lower or "email" in question_lower or "empresa" in question_lower):
-                # Detecta fraudes via email
-                result = self.tools_instance.detect_email_based_fraud("")
-                self.chat_history.append(f"User: {question}")
-                self.chat_history.append(f"Agent: {result}")
-                return result
+            if intent in MISSING_TX_MESSAGES and not tx_id:
+                return MISSING_TX_MESSAGES[intent]
             
-            elif "refeicao" in question_lower or "meal" in question_lower:
-                # Valida refeição
-                import re
-                tx_id_match = re.search(r'TX_\d+', question, re.IGNORECASE)
-                if tx_id_match:
-                    tx_id = tx_id_match.group()
-                    result = self.tools_instance.validate_business_meal(tx_id)
-                    self.chat_history.append(f"User: {question}")
-                    self.chat_history.append(f"Agent: {result}")
-                    return result
-                else:
-                    return "Por favor, especifique o ID da transacao (ex: TX_1006)"
-            
-            elif "contexto" in question_lower or "context" in question_lower:
-                # Obtém contexto
-                import re
-                tx_id_match = re.search(r'TX_\d+', question, re.IGNORECASE)
-                if tx_id_match:
-                    tx_id = tx_id_match.group()
-                    result = self.tools_instance.get_transaction_context(tx_id)
-                    self.chat_history.append(f"User: {question}")
-                    self.chat_history.append(f"Agent: {result}")
-                    return result
-                else:
-                    return "Por favor, especifique o ID da transacao"
-            
-            else:
+            if intent == 'llm':
                 # Resposta genérica usando LLM
-                prompt = ChatPromptTemplate.from_messages([
-                    ("system", """Voce e um agente de auditoria de compliance da Dunder Mifflin.
-                    Voce pode ajudar com:
-                    1. Verificar aprovacao de transacoes (use: "Verifique a aprovacao da transacao TX_XXXX")
-                    2. Detectar fraudes via email (use: "Detecte fraudes combinadas")
-                    3. Validar refeicoes corporativas (use: "Valide a refeicao da transacao TX_XXXX")
-                    4. Obter contexto de transacoes (use: "Analise o contexto da transacao TX_XXXX")
-                    """),
-                    ("human", "{input}")
-                ])
-                
-                chain = prompt | self.llm
-                response = chain.invoke({"input": question})
-                result = response.content
-                
-                self.chat_history.append(f"User: {question}")
-                self.chat_history.append(f"Agent: {result}")
-                return result
+                result = self._timed('llm', self.fallback_chain.invoke, {"input": question}).content
+            else:
+                result = self._timed('ferramenta', self._run_tool, intent, tx_id)
+            
+            self._remember(question, result, intent, tx_id)
+            return result
                 
         except Exception as e:
             return f"Erro ao processar pergunta: {str(e)}"
     
+    def query_many(self, questions: List[str], max_concurrency: int = 4,
+                   executor: Optional[ThreadPoolExecutor] = None) -> List[str]:
+        """
+        Processa varias perguntas de uma vez.
+        
+        Chamadas de ferramenta identicas (mesma intencao e mesma transacao,
+        ou a varredura completa de fraudes) sao executadas uma unica vez e
+        compartilhadas. As perguntas sem ferramenta vao para o LLM em paralelo,
+        no mesmo pool (limitado por max_concurrency).
+        
+        Args:
+            questions: Lista de perguntas
+            max_concurrency: Limite de chamadas simultaneas (ferramentas e LLM)
+            executor: Pool ja existente (ex: o do audit_service); sem ele, cria
+                um pool proprio de max_concurrency threads so para esta chamada
+        
+        Returns:
+            Respostas na mesma ordem das perguntas
+        """
+        results: List[Optional[str]] = [None] * len(questions)
+        tool_calls: Dict[Tuple[str, Optional[str]], List[int]] = {}
+        llm_indices: List[int] = []
+        routes: Dict[int, Tuple[str, Optional[str]]] = {}
+        
+        for idx, question in enumerate(questions):
+            try:
+                intent, tx_id = self._route(question)
+            except Exception as e:
+                results[idx] = f"Erro ao processar pergunta: {str(e)}"
+                continue
+            routes[idx] = (intent, tx_id)
+            
+            if intent == 'llm':
+                llm_indices.append(idx)
+            elif intent in MISSING_TX_MESSAGES and not tx_id:
+                results[idx] = MISSING_TX_MESSAGES[intent]
+            else:
+                tool_calls.setdefault((intent, tx_id), []).append(idx)
+        
+        answered = set()
+        
+        pool = nullcontext(executor) if executor else ThreadPoolExecutor(max_workers=max_concurrency)
+        with pool as executor:
+            futures = {
+                key: executor.submit(self._timed, 'ferramenta', self._run_tool, *key)
+                for key in tool_calls
+            }
+            
+            # Cada chamada ao LLM passa por _timed, como em query()
+            llm_futures = {
+                idx: executor.submit(self._timed, 'llm', self.fallback_chain.invoke, {"input": questions[idx]})
+                for idx in llm_indices
+            }
+            for idx, future in llm_futures.items():
+                try:
+                    results[idx] = future.result().content
+                    answered.add(idx)
+                except Exception as e:
+                    results[idx] = f"Erro ao processar pergunta: {str(e)}"
+            
+            for key, future in futures.items():
+                try:
+                    result = future.result()
+                    answered.update(tool_calls[key])
+                except Exception as e:
+                    result = f"Erro ao processar pergunta: {str(e)}"
+                for idx in tool_calls[key]:
+                    results[idx] = result
+        
+        for idx in sorted(answered):
+            self._remember(questions[idx], results[idx], *routes[idx])
+        
+        return results
+    
     def get_conversation_history(self) -> List[str]:
         """
-        Retorna historico da conversa.
+        Retorna historico recente da conversa.
+        
+        Saidas de ferramentas aparecem como referencia compacta; turnos
+        antigos ficam no resumo de self.memory.
         
         Returns:
             Lista de mensagens do historico
         """
-        return self.chat_history
+        return self.memory.get_history()
 
-def main():
+def run_batch_file(agent: ComplianceAgentLangChain, input_path: str, output_path: Optional[str] = None, max_concurrency: int = 4):
+    """
+    Executa perguntas de um arquivo JSONL (uma pergunta por linha).
+    
+    Cada linha deve ter "question" (ou "body"/"title", como no requests.jsonl)
+    e opcionalmente "id" ou "request_id". As respostas sao gravadas em JSONL.
+    """
+    items = []
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            items.append({
+                'id': data.get('id') or data.get('request_id') or line_number,
+                'question': data.get('question') or data.get('body') or data.get('title', '')
+            })
+    
+    answers = agent.query_many([item['question'] for item in items], max_concurrency=max_concurrency)
+    
+    out = open(output_path, 'w', encoding='utf-8') if output_path else sys.stdout
+    try:
+        for item, answer in zip(items, answers):
+            out.write(json.dumps({**item, 'answer': answer}, ensure_ascii=False) + "\n")
+    finally:
+        if output_path:
+            out.close()
+    
+    return len(items)
+
+def main(argv: Optional[List[str]] = None):
     """
     Funcao principal para execucao do agente via linha de comando.
     """
+    parser = argparse.ArgumentParser(description='Agente de auditoria (LangChain + Gemini)')
+    parser.add_argument('--batch', help='Arquivo JSONL com perguntas para processar em lote')
+    parser.add_argument('--output', help='Arquivo JSONL de saida (padrao: stdout)')
+    parser.add_argument('--workers', type=int, default=4, help='Chamadas simultaneas no modo lote')
+    args = parser.parse_args(argv)
+    
+    if args.batch:
+        agent = ComplianceAgentLangChain()
+        total = run_batch_file(agent, args.batch, args.output, max_concurrency=args.workers)
+        print(f"{total} perguntas processadas.", file=sys.stderr)
+        return
+    
     print("=" * 70)
     print("AGENTE DE AUDITORIA - DUNDER MIFFLIN (LangChain + Gemini)")
     print("=" * 70)
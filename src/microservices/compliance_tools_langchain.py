@@ -5,6 +5,7 @@ import json
 
 from utils.email_parser import EmailParser
 from utils.config import Config
+from fraud_schemes import FraudSchemeScanner
 
 class ComplianceToolsLangChain:
     def __init__(self):
@@ -18,6 +19,7 @@ class ComplianceToolsLangChain:
         )
         
         self.email_parser = EmailParser(self.email_path)
+        self.fraud_scanner = FraudSchemeScanner()
     
     def audit_transaction_approval(self, transaction_id: str) -> str:
         """
@@ -128,9 +130,9 @@ class ComplianceToolsLangChain:
                     self._analyze_single_transaction(transacao.iloc[0])
                 )
         else:
-            fraudes_detectadas.extend(self._analyze_wcs_supplies_fraud())
-            fraudes_detectadas.extend(self._analyze_tech_solutions_fraud())
-            fraudes_detectadas.extend(self._analyze_serenity_candles_fraud())
+            fraudes_detectadas.extend(
+                self.fraud_scanner.scan(self.email_parser.emails, self.df)
+            )
         
         if not fraudes_detectadas:
             return "Nenhuma fraude combinada detectada via analise de emails."
@@ -174,93 +176,6 @@ class ComplianceToolsLangChain:
         
         return fraudes
     
-    def _analyze_wcs_supplies_fraud(self) -> List[Dict]:
-        fraudes = []
-        
-        emails_creed_kevin = self.email_parser.search_emails(
-            from_name='Creed Bratton',
-            to_name='Kevin Malone',
-            keywords=['WCS', 'Supplies', 'qualidade', 'cola']
-        )
-        
-        if emails_creed_kevin:
-            transacoes_wcs = self.df[
-                self.df['fornecedor'].str.contains('WCS', case=False, na=False)
-            ]
-            
-            for _, tx in transacoes_wcs.iterrows():
-                fraude = {
-                    'tipo': 'FRAUDE_COMBINADA_WCS',
-                    'transacao_id': tx['id_transacao'],
-                    'valor': tx['valor'],
-                    'funcionario': tx['funcionario'],
-                    'fornecedor': tx['fornecedor'],
-                    'evidencia_emails': len(emails_creed_kevin),
-                    'exemplo_assunto': emails_creed_kevin[0]['assunto']
-                }
-                fraudes.append(fraude)
-        
-        return fraudes
-    
-    def _analyze_tech_solutions_fraud(self) -> List[Dict]:
-        fraudes = []
-        
-        emails_ryan = self.email_parser.search_emails(
-            from_name='Ryan Howard',
-            keywords=['Tech Solutions', 'WUPHF', 'servidor', 'AWS']
-        )
-        
-        if emails_ryan:
-            transacoes_tech = self.df[
-                self.df['fornecedor'].str.contains('Tech Solutions', case=False, na=False)
-            ]
-            
-            for _, tx in transacoes_tech.iterrows():
-                fraude = {
-                    'tipo': 'CONFLITO_INTERESSES_TECH',
-                    'transacao_id': tx['id_transacao'],
-                    'valor': tx['valor'],
-                    'funcionario': tx['funcionario'],
-                    'evidencia_emails': len(emails_ryan),
-                    'exemplo_assunto': emails_ryan[0]['assunto'],
-                    'detalhes': 'Ryan Howard desviando verba para startup pessoal WUPHF'
-                }
-                fraudes.append(fraude)
-        
-        return fraudes
-    
-    def _analyze_serenity_candles_fraud(self) -> List[Dict]:
-        fraudes = []
-        
-        emails_jan = self.email_parser.search_emails(
-            from_name='Jan Levinson',
-            keywords=['Serenity', 'vela', 'candle']
-        )
-        
-        emails_michael_jan = self.email_parser.search_emails(
-            from_name='Michael Scott',
-            to_name='Jan Levinson',
-            keywords=['vela', 'Serenity']
-        )
-        
-        if emails_jan or emails_michael_jan:
-            transacoes_velas = self.df[
-                self.df['descricao'].str.contains('vela|serenity|candle', case=False, na=False)
-            ]
-            
-            for _, tx in transacoes_velas.iterrows():
-                fraude = {
-                    'tipo': 'CONFLITO_INTERESSES_SERENITY',
-                    'transacao_id': tx['id_transacao'],
-                    'valor': tx['valor'],
-                    'funcionario': tx['funcionario'],
-                    'evidencia_emails': len(emails_jan) + len(emails_michael_jan),
-                    'detalhes': 'Compra de velas da empresa de Jan Levinson (Serenity by Jan)'
-                }
-                fraudes.append(fraude)
-        
-        return fraudes
-    
     def validate_business_meal(self, transaction_id: str) -> str:
         """
         Valida se uma refeicao corporativa teve objetivo legitimo de negocio.
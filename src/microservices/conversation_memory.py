@@ -0,0 +1,144 @@
+import hashlib
+import threading
+from collections import deque
+from typing import List, Dict, Optional, Callable
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa grosseira de tokens (~4 caracteres por token)"""
+    return max(1, len(text) // 4)
+
+
+class ConversationMemory:
+    """
+    Memoria de conversa com tamanho limitado.
+
+    - Guarda os turnos recentes em um buffer circular, dentro de um orcamento de tokens.
+    - Saidas de ferramentas sao guardadas como referencia compacta
+      (ferramenta + transacao + hash do resultado), nunca o JSON completo.
+    - Turnos antigos saem do buffer e so sao resumidos quando o resumo e pedido.
+    """
+
+    def __init__(self,
+                 max_turns: int = 20,
+                 max_tokens: int = 2000,
+                 max_summary_lines: int = 30,
+                 summarizer: Optional[Callable[[str, List[str]], str]] = None):
+        """
+        Args:
+            max_turns: Numero maximo de turnos recentes mantidos na integra
+            max_tokens: Orcamento de tokens dos turnos recentes
+            max_summary_lines: Linhas maximas do resumo extrativo padrao
+            summarizer: Funcao opcional (resumo_anterior, linhas_novas) -> novo resumo,
+                por exemplo uma chamada ao LLM
+        """
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+
+        self._turns: deque = deque(maxlen=max_turns)
+        self._tokens = 0
+        self._pending: List[Dict] = []
+        self._summary_lines: deque = deque(maxlen=max_summary_lines)
+        self._summary = ""
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def tool_reference(tool: str, tx_id: Optional[str], result: str) -> str:
+        """Referencia compacta para uma saida de ferramenta"""
+        digest = hashlib.sha256(result.encode('utf-8')).hexdigest()[:12]
+        alvo = tx_id or 'geral'
+        return f"[{tool}:{alvo}#{digest}]"
+
+    def add_turn(self, question: str, answer: str, tool: Optional[str] = None, tx_id: Optional[str] = None):
+        """
+        Registra um turno da conversa.
+
+        Args:
+            question: Pergunta do usuario
+            answer: Resposta do agente
+            tool: Nome da ferramenta usada, se houver (a resposta vira referencia)
+            tx_id: Transacao consultada pela ferramenta
+        """
+        agent_text = self.tool_reference(tool, tx_id, answer) if tool else answer
+        turn = {
+            'user': question,
+            'agent': agent_text,
+            'tokens': estimate_tokens(question) + estimate_tokens(agent_text)
+        }
+
+        with self._lock:
+            if len(self._turns) == self._turns.maxlen:
+                self._evict()
+
+            self._turns.append(turn)
+            self._tokens += turn['tokens']
+
+            while self._tokens > self.max_tokens and len(self._turns) > 1:
+                self._evict()
+
+    def _evict(self):
+        turn = self._turns.popleft()
+        self._tokens -= turn['tokens']
+        self._pending.append(turn)
+
+        # Resume em blocos para a fila de pendentes tambem ficar limitada
+        if len(self._pending) >= self._turns.maxlen:
+            self._fold_pending()
+
+    def _fold_pending(self):
+        """Resume os turnos que sairam do buffer (chamado sob demanda)"""
+        if not self._pending:
+            return
+
+        linhas = [
+            f"- {turn['user'][:80]} -> {turn['agent'][:80]}"
+            for turn in self._pending
+        ]
+        self._pending = []
+
+        if self.summarizer:
+            self._summary = self.summarizer(self._summary, linhas)
+        else:
+            self._summary_lines.extend(linhas)
+            self._summary = "\n".join(self._summary_lines)
+
+    def get_summary(self) -> str:
+        """Resumo dos turnos antigos"""
+        with self._lock:
+            self._fold_pending()
+            return self._summary
+
+    def get_history(self) -> List[str]:
+        """Turnos recentes no formato 'User: ...' / 'Agent: ...'"""
+        with self._lock:
+            history = []
+            for turn in self._turns:
+                history.append(f"User: {turn['user']}")
+                history.append(f"Agent: {turn['agent']}")
+            return history
+
+    def as_prompt(self) -> str:
+        """Resumo + turnos recentes, pronto para ser usado em um prompt"""
+        summary = self.get_summary()
+        partes = []
+        if summary:
+            partes.append(f"Resumo da conversa anterior:\n{summary}")
+        partes.extend(self.get_history())
+        return "\n".join(partes)
+
+    def clear(self):
+        with self._lock:
+            self._turns.clear()
+            self._tokens = 0
+            self._pending = []
+            self._summary_lines.clear()
+            self._summary = ""
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'turnos_recentes': len(self._turns),
+                'tokens_recentes': self._tokens,
+                'turnos_pendentes_resumo': len(self._pending),
+                'linhas_resumo': len(self._summary_lines)
+            }
@@ -0,0 +1,164 @@
+import pandas as pd
+from typing import List, Dict
+
+
+# Registro declarativo de esquemas de fraude combinada (email + planilha).
+#
+# Cada esquema tem:
+#   - regras_email: lista de filtros (de / para / palavras-chave), com a mesma
+#     semantica de EmailParser.search_emails. Basta uma regra casar para o
+#     esquema ficar ativo.
+#   - regra_planilha: coluna da planilha e termos procurados (sem diferenciar
+#     maiusculas/minusculas).
+#   - saida: campos do resultado, na ordem em que aparecem, e texto fixo de detalhes.
+FRAUD_SCHEMES = [
+    {
+        'tipo': 'FRAUDE_COMBINADA_WCS',
+        'regras_email': [
+            {'de': 'Creed Bratton', 'para': 'Kevin Malone',
+             'palavras': ['WCS', 'Supplies', 'qualidade', 'cola']}
+        ],
+        'regra_planilha': {'coluna': 'fornecedor', 'termos': ['wcs']},
+        'saida': {
+            'campos': ['fornecedor', 'evidencia_emails', 'exemplo_assunto']
+        }
+    },
+    {
+        'tipo': 'CONFLITO_INTERESSES_TECH',
+        'regras_email': [
+            {'de': 'Ryan Howard',
+             'palavras': ['Tech Solutions', 'WUPHF', 'servidor', 'AWS']}
+        ],
+        'regra_planilha': {'coluna': 'fornecedor', 'termos': ['tech solutions']},
+        'saida': {
+            'campos': ['evidencia_emails', 'exemplo_assunto', 'detalhes'],
+            'detalhes': 'Ryan Howard desviando verba para startup pessoal WUPHF'
+        }
+    },
+    {
+        'tipo': 'CONFLITO_INTERESSES_SERENITY',
+        'regras_email': [
+            {'de': 'Jan Levinson', 'palavras': ['Serenity', 'vela', 'candle']},
+            {'de': 'Michael Scott', 'para': 'Jan Levinson', 'palavras': ['vela', 'Serenity']}
+        ],
+        'regra_planilha': {'coluna': 'descricao', 'termos': ['vela', 'serenity', 'candle']},
+        'saida': {
+            'campos': ['evidencia_emails', 'detalhes'],
+            'detalhes': 'Compra de velas da empresa de Jan Levinson (Serenity by Jan)'
+        }
+    }
+]
+
+
+class FraudSchemeScanner:
+    """Avalia todos os esquemas registrados com uma passada nos emails e uma na planilha"""
+
+    def __init__(self, schemes: List[Dict] = None):
+        self.schemes = FRAUD_SCHEMES if schemes is None else schemes
+
+        # Normaliza os filtros uma unica vez (lowercase)
+        self._regras = [
+            [
+                (
+                    regra.get('de', '').lower(),
+                    regra.get('para', '').lower(),
+                    [p.lower() for p in regra.get('palavras', [])]
+                )
+                for regra in scheme['regras_email']
+            ]
+            for scheme in self.schemes
+        ]
+        self._termos = [
+            [t.lower() for t in scheme['regra_planilha']['termos']]
+            for scheme in self.schemes
+        ]
+
+    def _scan_emails(self, emails: List[Dict]) -> List[Dict]:
+        """Passada unica nos emails: conta evidencias e guarda o primeiro assunto de cada esquema"""
+        evidencias = [
+            {'total': 0, 'exemplos': [None] * len(regras)}
+            for regras in self._regras
+        ]
+
+        for email in emails:
+            de = email['de_nome'].lower()
+            para = email['para_nome'].lower()
+            texto = f"{email['assunto']} {email['mensagem']}".lower()
+
+            for idx, regras in enumerate(self._regras):
+                for r, (de_regra, para_regra, palavras) in enumerate(regras):
+                    if de_regra and de_regra not in de:
+                        continue
+                    if para_regra and para_regra not in para:
+                        continue
+                    if palavras and not any(p in texto for p in palavras):
+                        continue
+
+                    evidencias[idx]['total'] += 1
+                    if evidencias[idx]['exemplos'][r] is None:
+                        evidencias[idx]['exemplos'][r] = email['assunto']
+
+        return evidencias
+
+    def scan(self, emails: List[Dict], df: pd.DataFrame) -> List[Dict]:
+        """
+        Detecta fraudes de todos os esquemas.
+
+        Args:
+            emails: Emails ja parseados (EmailParser.emails)
+            df: Planilha de transacoes com a coluna 'fornecedor'
+
+        Returns:
+            Lista de fraudes, agrupadas na ordem do registro
+        """
+        evidencias = self._scan_emails(emails)
+        ativos = [idx for idx, ev in enumerate(evidencias) if ev['total'] > 0]
+
+        if not ativos:
+            return []
+
+        fraudes_por_esquema = {idx: [] for idx in ativos}
+
+        colunas = {self.schemes[idx]['regra_planilha']['coluna'] for idx in ativos}
+
+        for tx in df.itertuples(index=False):
+            valores = {
+                coluna: str(getattr(tx, coluna)).lower()
+                for coluna in colunas
+                if not pd.isna(getattr(tx, coluna))
+            }
+
+            for idx in ativos:
+                texto = valores.get(self.schemes[idx]['regra_planilha']['coluna'])
+                if texto is None or not any(t in texto for t in self._termos[idx]):
+                    continue
+
+                fraudes_por_esquema[idx].append(
+                    self._build_output(self.schemes[idx], tx, evidencias[idx])
+                )
+
+        fraudes = []
+        for idx in ativos:
+            fraudes.extend(fraudes_por_esquema[idx])
+
+        return fraudes
+
+    def _build_output(self, scheme: Dict, tx, evidencia: Dict) -> Dict:
+        exemplo = next((e for e in evidencia['exemplos'] if e is not None), None)
+        disponiveis = {
+            'fornecedor': tx.fornecedor,
+            'evidencia_emails': evidencia['total'],
+            'exemplo_assunto': exemplo,
+            'detalhes': scheme['saida'].get('detalhes')
+        }
+
+        fraude = {
+            'tipo': scheme['tipo'],
+            'transacao_id': tx.id_transacao,
+            'valor': tx.valor,
+            'funcionario': tx.funcionario
+        }
+        for campo in scheme['saida']['campos']:
+            fraude[campo] = disponiveis[campo]
+
+        return fraude
@@ -0,0 +1,220 @@
+import re
+import math
+import time
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Tuple
+
+
+TX_ID_PATTERN = re.compile(r'TX_\d+', re.IGNORECASE)
+
+# Regras diretas (mesma prioridade do roteamento original por palavras-chave).
+# O texto e normalizado sem acentos antes da busca.
+INTENT_PATTERNS = [
+    ('aprovacao', re.compile(r'aprovacao|aprovar')),
+    ('fraudes', re.compile(r'^(?=.*fraud)(?=.*(?:combinada|email|empresa))', re.DOTALL)),
+    ('refeicao', re.compile(r'refeicao|meal')),
+    ('contexto', re.compile(r'contexto|context'))
+]
+
+# Exemplos de parafrases usados para treinar o classificador TF-IDF
+INTENT_EXAMPLES = {
+    'aprovacao': [
+        "quem autorizou a transacao TX_1296",
+        "essa compra foi autorizada por alguem",
+        "a TX_1296 tem assinatura do Michael",
+        "a despesa respeitou a alcada de aprovacao",
+        "precisa de PO do CFO para essa compra",
+        "o gerente regional aprovou esse gasto",
+        "check the approval of TX_1296",
+        "was this transaction authorized"
+    ],
+    'fraudes': [
+        "existe algum esquema de desvio de verba",
+        "ha conluio entre funcionarios nos emails",
+        "quais funcionarios estao desviando dinheiro",
+        "liste os conflitos de interesses da filial",
+        "quem esta roubando a empresa",
+        "procure colusao entre Creed e Kevin",
+        "detect fraud schemes in the emails",
+        "is there any collusion between employees"
+    ],
+    'refeicao': [
+        "o almoco da TX_1006 foi com cliente",
+        "esse jantar foi de negocios",
+        "a conta do restaurante foi legitima",
+        "foi um almoco de trabalho ou pessoal",
+        "o jantar no Chili's teve objetivo comercial",
+        "validate the lunch TX_1006",
+        "was this dinner a business meeting"
+    ],
+    'contexto': [
+        "me mostre os emails da TX_1094",
+        "o que aconteceu na transacao TX_1094",
+        "detalhes da transacao TX_1094",
+        "quais emails falam dessa compra",
+        "explique essa transacao",
+        "quem participou da TX_1094",
+        "show the details for TX_1094",
+        "what happened with this transaction"
+    ],
+    # Exemplos negativos: perguntas gerais que devem ir para o LLM
+    'llm': [
+        "explique a politica de reembolso",
+        "detalhes da politica de viagens",
+        "qual e o limite de gastos",
+        "o que diz a politica sobre bebidas alcoolicas",
+        "quais emails mencionam o Dwight",
+        "o que voce sabe fazer",
+        "quais comandos estao disponiveis",
+        "what happened",
+        "explain the expense policy"
+    ]
+}
+
+# Intencoes que precisam de um ID de transacao
+TX_INTENTS = {'aprovacao', 'refeicao', 'contexto'}
+
+STOPWORDS = {
+    'a', 'o', 'as', 'os', 'e', 'de', 'da', 'do', 'das', 'dos', 'em', 'na', 'no',
+    'um', 'uma', 'por', 'para', 'com', 'que', 'se', 'foi', 'essa', 'esse', 'isso',
+    'me', 'ou', 'ha', 'the', 'of', 'for', 'in', 'is', 'was', 'this', 'with', 'there', 'any'
+}
+
+
+def normalize(text: str) -> str:
+    """Minusculas e sem acentos"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokens normalizados, sem IDs de transacao e com radical simples (5 letras)"""
+    text = TX_ID_PATTERN.sub(' ', normalize(text))
+    return [
+        token[:5]
+        for token in re.findall(r'[a-z]+', text)
+        if token not in STOPWORDS and len(token) > 1
+    ]
+
+
+class IntentRouter:
+    """
+    Roteador de intencoes sem chamada ao LLM.
+
+    1. Regras compiladas (confianca 1.0).
+    2. Classificador TF-IDF por similaridade com os exemplos de cada intencao.
+    3. Abaixo dos limiares de confianca, a pergunta vai para o LLM ('llm').
+    """
+
+    def __init__(self,
+                 examples: Dict[str, List[str]] = None,
+                 min_confidence: float = 0.35,
+                 min_margin: float = 0.05,
+                 min_matches: int = 2):
+        self.min_confidence = min_confidence
+        self.min_margin = min_margin
+        self.min_matches = min_matches
+        self._train(examples or INTENT_EXAMPLES)
+
+        self.stats = Counter()
+        self.total_route_seconds = 0.0
+        # O roteador e compartilhado entre as threads do audit_service
+        self._stats_lock = threading.Lock()
+
+    def _train(self, examples: Dict[str, List[str]]):
+        documentos = [
+            (intent, tokenize(frase))
+            for intent, frases in examples.items()
+            for frase in frases
+        ]
+
+        df = Counter()
+        for _, tokens in documentos:
+            df.update(set(tokens))
+
+        total = len(documentos)
+        self.idf = {token: math.log((1 + total) / (1 + freq)) + 1 for token, freq in df.items()}
+        self.vectors = [(intent, self._vectorize(tokens)) for intent, tokens in documentos]
+
+    def _vectorize(self, tokens: List[str]) -> Dict[str, float]:
+        tf = Counter(t for t in tokens if t in self.idf)
+        vetor = {t: freq * self.idf[t] for t, freq in tf.items()}
+        norma = math.sqrt(sum(v * v for v in vetor.values()))
+        return {t: v / norma for t, v in vetor.items()} if norma else {}
+
+    def _classify(self, question: str) -> Dict[str, Tuple[float, int]]:
+        """Por intencao: (maior cosseno, tokens em comum com esse exemplo)"""
+        consulta = self._vectorize(tokenize(question))
+        melhores = {}
+        for intent, vetor in self.vectors:
+            score = sum(peso * vetor.get(t, 0.0) for t, peso in consulta.items())
+            if score > melhores.get(intent, (0.0, 0))[0]:
+                melhores[intent] = (score, sum(1 for t in consulta if t in vetor))
+            else:
+                melhores.setdefault(intent, (0.0, 0))
+        return melhores
+
+    def classify(self, question: str) -> Dict[str, float]:
+        """Maior similaridade de cosseno com os exemplos de cada intencao"""
+        return {intent: score for intent, (score, _) in self._classify(question).items()}
+
+    def route(self, question: str) -> Dict:
+        """
+        Decide a intencao de uma pergunta.
+
+        Returns:
+            Dict com intent, tx_id, confianca, metodo e latencia_ms
+        """
+        inicio = time.perf_counter()
+
+        tx_id_match = TX_ID_PATTERN.search(question)
+        tx_id = tx_id_match.group() if tx_id_match else None
+        texto = normalize(question)
+
+        resultado = None
+        for intent, pattern in INTENT_PATTERNS:
+            if pattern.search(texto):
+                resultado = {'intent': intent, 'confianca': 1.0, 'metodo': 'regra'}
+                break
+
+        if resultado is None:
+            scores = sorted(self._classify(question).items(), key=lambda x: x[1][0], reverse=True)
+            melhor_intent, (melhor, comuns) = scores[0] if scores else ('llm', (0.0, 0))
+            segundo = scores[1][1][0] if len(scores) > 1 else 0.0
+
+            # Sem ID de transacao, um unico radical em comum (ex: "expli",
+            # "detal") nao basta; ferramentas de transacao sem ID ficam com o LLM
+            confiavel = (
+                melhor >= self.min_confidence
+                and melhor - segundo >= self.min_margin
+                and (comuns >= self.min_matches or tx_id is not None)
+            )
+            if confiavel and melhor_intent != 'llm' and not (melhor_intent in TX_INTENTS and not tx_id):
+                resultado = {'intent': melhor_intent, 'confianca': round(melhor, 3), 'metodo': 'classificador'}
+            else:
+                resultado = {'intent': 'llm', 'confianca': round(melhor, 3), 'metodo': 'llm'}
+
+        # A varredura completa de fraudes nao depende de transacao
+        resultado['tx_id'] = None if resultado['intent'] == 'fraudes' else tx_id
+
+        duracao = time.perf_counter() - inicio
+        with self._stats_lock:
+            self.total_route_seconds += duracao
+            self.stats[resultado['metodo']] += 1
+        resultado['latencia_ms'] = round(duracao * 1000, 3)
+
+        return resultado
+
+    def get_stats(self) -> Dict:
+        """Distribuicao dos metodos de roteamento e latencia media"""
+        with self._stats_lock:
+            por_metodo = dict(self.stats)
+            total_seconds = self.total_route_seconds
+        total = sum(por_metodo.values())
+        return {
+            'total': total,
+            'por_metodo': por_metodo,
+            'latencia_media_ms': round(total_seconds / total * 1000, 3) if total else 0.0
+        }
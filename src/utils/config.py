@@ -8,6 +8,25 @@ class Config:
     CSV_PATH = os.getenv('CSV_PATH', 'data/transacoes_bancarias.csv')
     EMAIL_PATH = os.getenv('EMAIL_PATH', 'data/emails.txt')
     POLICY_PATH = os.getenv('POLICY_PATH', 'data/politica_compliance.txt')
+    # Chunking das políticas: 'secoes' (por seção/regra) ou 'recursivo'
+    POLICY_CHUNKER = os.getenv('POLICY_CHUNKER', 'secoes')
+    
+    # Busca vetorial do chatbot de compliance: 'chroma' ou 'numpy'
+    VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma')
+    VECTOR_STORE_PATH = os.getenv('VECTOR_STORE_PATH')
+    VECTOR_IVF_LISTS = int(os.getenv('VECTOR_IVF_LISTS', '0'))
+    VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', '4'))
+    # Indice quantizado do backend numpy: 'none', 'int8' ou 'binary'
+    VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'none')
+    VECTOR_RESCORE = int(os.getenv('VECTOR_RESCORE', '4'))
+    
+    # Recuperacao do chatbot: 'mmr', 'none' ou nome de um cross-encoder
+    RAG_RERANKER = os.getenv('RAG_RERANKER', 'mmr')
+    RAG_CONTEXT_TOKENS = int(os.getenv('RAG_CONTEXT_TOKENS', '1200'))
+    
+    # Cache semantico de respostas do chatbot
+    RAG_CACHE_PATH = os.getenv('RAG_CACHE_PATH')
+    RAG_CACHE_THRESHOLD = float(os.getenv('RAG_CACHE_THRESHOLD', '0.95'))
     
     @classmethod
     def validate(cls):
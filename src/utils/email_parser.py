@@ -1,14 +1,27 @@
 import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 
 class EmailParser:
-    def __init__(self, email_file_path: str):
+    def __init__(self, email_file_path: str, context_cache_size: int = 256):
         self.email_file_path = email_file_path
         self.emails: List[Dict] = []
-        self._parse_emails()
+        
+        # Cache LRU de get_emails_by_transaction_context
+        self.context_cache_size = context_cache_size
+        self._context_cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Incrementada a cada reload: buscas iniciadas antes nao gravam no cache novo
+        self._generation = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        self.emails = self._parse_emails()
     
-    def _parse_emails(self):
+    def _parse_emails(self) -> List[Dict]:
+        emails = []
         with open(self.email_file_path, 'r', encoding='utf-8') as file:
             content = file.read()
         
@@ -20,7 +33,42 @@ class EmailParser:
             
             email_data = self._extract_email_data(section)
             if email_data:
-                self.emails.append(email_data)
+                # ID estavel: posicao do email no dump (mesma convencao do load_emails)
+                email_data['id'] = len(emails) + 1
+                emails.append(email_data)
+        
+        return emails
+    
+    def reload(self):
+        """
+        Rele o arquivo de emails e invalida o cache de contexto.
+        
+        O parse acontece fora do lock; a troca da lista e a limpeza do cache
+        sao feitas juntas, entao leitores concorrentes nunca veem a lista vazia.
+        """
+        emails = self._parse_emails()
+        with self._cache_lock:
+            self.emails = emails
+            self._generation += 1
+            self._context_cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+    
+    def clear_cache(self):
+        """Limpa o cache de contexto e zera os contadores"""
+        with self._cache_lock:
+            self._context_cache.clear()
+            self.cache_hits = 0
+            self.cache_misses = 0
+    
+    def cache_info(self) -> Dict:
+        """Retorna estatisticas do cache de contexto"""
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'size': len(self._context_cache),
+            'maxsize': self.context_cache_size
+        }
     
     def _extract_email_data(self, section: str) -> Optional[Dict]:
         patterns = {
@@ -86,6 +134,33 @@ class EmailParser:
                                          fornecedor: str,
                                          valor: float) -> List[Dict]:
         
+        chave = (funcionario, data_transacao.date(), fornecedor, float(valor))
+        
+        with self._cache_lock:
+            if chave in self._context_cache:
+                self.cache_hits += 1
+                self._context_cache.move_to_end(chave)
+                return list(self._context_cache[chave])
+            self.cache_misses += 1
+            generation = self._generation
+        
+        emails_unicos = self._search_transaction_context(funcionario, data_transacao, fornecedor, valor)
+        
+        with self._cache_lock:
+            if generation != self._generation:
+                return list(emails_unicos)
+            self._context_cache[chave] = emails_unicos
+            if len(self._context_cache) > self.context_cache_size:
+                self._context_cache.popitem(last=False)
+        
+        return list(emails_unicos)
+    
+    def _search_transaction_context(self,
+                                    funcionario: str,
+                                    data_transacao: datetime,
+                                    fornecedor: str,
+                                    valor: float) -> List[Dict]:
+        
         data_inicio = data_transacao.replace(hour=0, minute=0, second=0)
         data_fim = data_transacao.replace(hour=23, minute=59, second=59)
         
@@ -116,9 +191,8 @@ class EmailParser:
         emails_unicos = []
         vistos = set()
         for email in emails_encontrados:
-            ident = f"{email['de']}_{email['assunto']}_{email['data'].timestamp()}"
-            if ident not in vistos:
-                vistos.add(ident)
+            if email['id'] not in vistos:
+                vistos.add(email['id'])
                 emails_unicos.append(email)
         
         return emails_unicos
\ No newline at end of file
@@ -0,0 +1,43 @@
+import numpy as np
+
+from src.agents.compliance_rag.vector_store import NumpyVectorStore
+
+
+def _store(path):
+    store = NumpyVectorStore(str(path), criar=True, quantizacao='int8', ivf_lists=2)
+    rng = np.random.default_rng(0)
+    store.upsert(['a', 'b', 'c'], ['x', 'y', 'z'], [{'inicio': 0}, {'inicio': 5}, {}], rng.random((3, 8)))
+    return store
+
+
+def test_update_metadata_e_upsert_no_mesmo_lote(tmp_path):
+    store = _store(tmp_path)
+    novo = np.arange(8, dtype=np.float32) + 1
+
+    # Mesma mistura do policy_loader: metadados movidos e re-embeddings no mesmo lote
+    with store.em_lote():
+        store.update_metadata(['a'], [{'inicio': 9}])
+        store.upsert(['a', 'd'], ['x2', 'w'], [{'inicio': 9}, {}], np.stack([novo, novo]))
+
+    reaberto = NumpyVectorStore(str(tmp_path), quantizacao='int8', ivf_lists=2)
+    pos = reaberto._posicoes['a']
+    assert reaberto.count() == 4
+    assert reaberto.metadatas[pos] == {'inicio': 9}
+    assert reaberto.documents[pos] == 'x2'
+    assert np.allclose(reaberto.matrix[pos], novo / np.linalg.norm(novo))
+    assert reaberto.codes.shape[0] == 4
+    assert reaberto.assignments.shape[0] == 4
+
+
+def test_lote_grava_uma_vez(tmp_path):
+    store = _store(tmp_path)
+    gravacoes = []
+    salvar = store._save
+    store._save = lambda matrix: (gravacoes.append(len(matrix)), salvar(matrix))
+
+    with store.em_lote():
+        store.delete(['b'])
+        store.update_metadata(['c'], [{'inicio': 1}])
+        store.upsert(['e'], ['v'], [{}], np.ones((1, 8)))
+
+    assert gravacoes == [3]